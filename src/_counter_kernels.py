@@ -0,0 +1,107 @@
+"""
+Geometry kernels for the line crossing counter
+
+The kernels are compiled with Numba when it is installed; otherwise the
+batch check falls back to vectorized NumPy.
+"""
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:  # pragma: no cover - depends on environment
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        """No-op replacement for numba.njit"""
+        def decorator(func):
+            return func
+        return decorator
+
+# Return codes of _check_crossing_scalar
+NO_CROSSING = -1
+CROSSING_OUT = 0
+CROSSING_IN = 1
+
+
+# Positions are float32 (pixel coordinates), the line is given in float64;
+# products are promoted to float64 so the cross products stay exact
+@njit('int64(float32, float32, float32, float32, float64, float64, float64, float64)',
+      cache=True, fastmath=True)
+def _check_crossing_scalar(prev_x, prev_y, cur_x, cur_y, lx1, ly1, line_vx, line_vy):
+    """
+    Check if the movement prev -> cur crosses the line starting at
+    (lx1, ly1) with direction vector (line_vx, line_vy)
+
+    Returns:
+        -1 if the line is not crossed, 0 for OUT, 1 for IN
+    """
+    # Movement u, line v and offset w between their start points
+    ux = cur_x - prev_x
+    uy = cur_y - prev_y
+    vx = line_vx
+    vy = line_vy
+    wx = prev_x - lx1
+    wy = prev_y - ly1
+
+    # Intersection parameters along both segments are s / d and t / d
+    d = ux * vy - uy * vx
+    s = vx * wy - vy * wx
+    t = ux * wy - uy * wx
+
+    crossed = ((d != 0) & (s * d >= 0) & (t * d >= 0) &
+               (abs(s) <= abs(d)) & (abs(t) <= abs(d)))
+
+    # d is minus the line x movement cross product, so d < 0 means IN
+    return int(crossed) * (1 + int(d < 0)) - 1
+
+
+@njit('int8[:](float32[:, :], float32[:, :], float64, float64, float64, float64)', cache=True)
+def _check_crossings_loop(prev, cur, lx1, ly1, line_vx, line_vy):
+    """Run _check_crossing_scalar over (N, 2) arrays of positions"""
+    n = prev.shape[0]
+    result = np.empty(n, dtype=np.int8)
+    for i in range(n):
+        result[i] = _check_crossing_scalar(prev[i, 0], prev[i, 1], cur[i, 0], cur[i, 1],
+                                           lx1, ly1, line_vx, line_vy)
+    return result
+
+
+def _check_crossings_numpy(prev: np.ndarray, cur: np.ndarray,
+                           lx1: float, ly1: float, line_vx: float, line_vy: float) -> np.ndarray:
+    """Vectorized equivalent of _check_crossings_loop"""
+    prev = prev.astype(np.float64)
+    cur = cur.astype(np.float64)
+
+    ux = cur[:, 0] - prev[:, 0]
+    uy = cur[:, 1] - prev[:, 1]
+    vx = line_vx
+    vy = line_vy
+    wx = prev[:, 0] - lx1
+    wy = prev[:, 1] - ly1
+
+    d = ux * vy - uy * vx
+    s = vx * wy - vy * wx
+    t = ux * wy - uy * wx
+
+    abs_d = np.abs(d)
+    crossed = ((d != 0) & (s * d >= 0) & (t * d >= 0) &
+               (np.abs(s) <= abs_d) & (np.abs(t) <= abs_d))
+
+    return crossed.astype(np.int8) * (1 + (d < 0).astype(np.int8)) - 1
+
+
+# Batch crossing check: (prev, cur, lx1, ly1, line_vx, line_vy) -> (N,) int8 codes,
+# with prev and cur as (N, 2) float32 arrays
+check_crossings = _check_crossings_loop if HAVE_NUMBA else _check_crossings_numpy
+
+
+def warm_up() -> None:
+    """Compile the kernels once so the first frame does not stall"""
+    dummy = np.zeros((1, 2), dtype=np.float32)
+    check_crossings(dummy, dummy, 0.0, 1.0, 1.0, -1.0)
+    if HAVE_NUMBA:
+        logger.debug("Counter kernels compiled with Numba")
@@ -0,0 +1,72 @@
+"""
+Track trail kernels for the visualizer
+
+Trails are kept in a ring buffer per track slot: trails[slot, k] holds a
+position, heads[slot] is the next write index and lens[slot] the number
+of stored positions. The kernels are compiled with Numba when it is
+installed; otherwise they run as plain Python.
+"""
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:  # pragma: no cover - depends on environment
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        """No-op replacement for numba.njit"""
+        def decorator(func):
+            return func
+        return decorator
+
+
+@njit(cache=True)
+def update_trails(trails, lens, heads, slots, centers):
+    """
+    Append centers[i] to the trail of slots[i], dropping the oldest
+    position once a trail is full
+    """
+    length = trails.shape[1]
+    for i in range(slots.shape[0]):
+        slot = slots[i]
+        head = heads[slot]
+        trails[slot, head, 0] = centers[i, 0]
+        trails[slot, head, 1] = centers[i, 1]
+        heads[slot] = (head + 1) % length
+        if lens[slot] < length:
+            lens[slot] += 1
+
+
+@njit(cache=True)
+def trail_points(trails, lens, heads, num_slots):
+    """
+    Integer trail points of the first num_slots slots, oldest first
+
+    Returns:
+        (num_slots, length, 2) int32 array; row slot is valid up to lens[slot]
+    """
+    length = trails.shape[1]
+    points = np.zeros((num_slots, length, 2), dtype=np.int32)
+    for slot in range(num_slots):
+        n = lens[slot]
+        start = (heads[slot] - n) % length
+        for k in range(n):
+            j = (start + k) % length
+            points[slot, k, 0] = int(trails[slot, j, 0])
+            points[slot, k, 1] = int(trails[slot, j, 1])
+    return points
+
+
+def warm_up() -> None:
+    """Compile the kernels once so the first frame does not stall"""
+    trails = np.zeros((1, 2, 2), dtype=np.float32)
+    lens = np.zeros(1, dtype=np.int32)
+    heads = np.zeros(1, dtype=np.int32)
+    update_trails(trails, lens, heads, np.zeros(1, dtype=np.intp), np.zeros((1, 2), dtype=np.float32))
+    trail_points(trails, lens, heads, 1)
+    if HAVE_NUMBA:
+        logger.debug("Visualizer kernels compiled with Numba")
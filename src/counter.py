@@ -1,11 +1,14 @@
 """
 Line crossing counter with anti-double-counting logic
 """
+import json
 import numpy as np
+from pathlib import Path
 from typing import List, Dict, Tuple
-from collections import defaultdict, deque
 import logging
 
+from _counter_kernels import check_crossings, warm_up, NO_CROSSING, CROSSING_IN
+
 logger = logging.getLogger(__name__)
 
 
@@ -14,35 +17,62 @@ class LineCrossingCounter:
     Counts people crossing a virtual line with direction detection
     """
 
+    # Number of track slots allocated up front (grows on demand)
+    INITIAL_CAPACITY = 256
+
+    # Sentinel for tracks that have not crossed yet (frame numbers are int32)
+    NEVER_CROSSED = -(2 ** 30)
+
     def __init__(self,
                  line_start: Tuple[float, float],
                  line_end: Tuple[float, float],
                  min_frames_between_crossings: int = 30,
-                 position_history_length: int = 10):
+                 position_history_length: int = 10,
+                 events_path: Path = None):
         """
         Args:
             line_start: (x, y) coordinates of line start
             line_end: (x, y) coordinates of line end
             min_frames_between_crossings: Minimum frames before same ID can cross again
             position_history_length: Number of positions to keep in history per track
+            events_path: JSONL file to stream events to (None keeps all events in memory)
         """
-        self.line_start = np.array(line_start)
-        self.line_end = np.array(line_end)
+        self.line_start = (float(line_start[0]), float(line_start[1]))
+        self.line_end = (float(line_end[0]), float(line_end[1]))
+
+        # Line start and direction vector as plain floats for the kernels
+        self._lx1, self._ly1 = self.line_start
+        self._line_vx = self.line_end[0] - self.line_start[0]
+        self._line_vy = self.line_end[1] - self.line_start[1]
         self.min_frames_between = min_frames_between_crossings
         self.history_length = position_history_length
 
-        # Track history: track_id -> deque of (frame, center_position)
-        self.track_history = defaultdict(lambda: deque(maxlen=position_history_length))
+        # Track history as a ring buffer per slot: track_id -> slot,
+        # hist_xy[slot, k] holds a position, hist_head[slot] counts appends
+        self.track_slots = {}
+        self.hist_xy = np.empty((self.INITIAL_CAPACITY, position_history_length, 2), dtype=np.float32)
+        self.hist_head = np.zeros(self.INITIAL_CAPACITY, dtype=np.int32)
 
-        # Last crossing frame for each track_id
-        self.last_crossing_frame = {}
+        # Last crossing frame for each slot
+        self.last_crossing_frame = np.full(self.INITIAL_CAPACITY, self.NEVER_CROSSED, dtype=np.int32)
 
         # Counters
         self.count_in = 0
         self.count_out = 0
 
-        # Event log
+        # Event log, kept in memory unless it is streamed to a file
+        self.events_path = events_path
         self.events = []
+        self._events_file = None
+        if events_path is not None:
+            events_path.parent.mkdir(parents=True, exist_ok=True)
+            self._events_file = open(events_path, 'w')
+
+        self.total_crossings = 0
+        self.crossed_tracks = set()
+
+        # Compile the crossing kernel up front instead of on the first frame
+        warm_up()
 
         logger.info(f"Initialized counter with line: {line_start} -> {line_end}")
 
@@ -59,99 +89,143 @@ class LineCrossingCounter:
         """
         frame_events = []
 
-        for track in tracks:
-            track_id = track['track_id']
-            center = np.array(track['center'])
-
-            # Add to history
-            self.track_history[track_id].append((frame_num, center))
-
-            # Need at least 2 positions to detect crossing
-            if len(self.track_history[track_id]) < 2:
-                continue
-
-            # Check if enough time passed since last crossing
-            if track_id in self.last_crossing_frame:
-                frames_since_last = frame_num - self.last_crossing_frame[track_id]
-                if frames_since_last < self.min_frames_between:
-                    continue
-
-            # Get previous position
-            prev_frame, prev_center = self.track_history[track_id][-2]
-
-            # Check if line was crossed
-            crossing_info = self._check_line_crossing(prev_center, center)
-
-            if crossing_info is not None:
-                direction = crossing_info['direction']
-
-                # Update counters
-                if direction == 'IN':
-                    self.count_in += 1
-                elif direction == 'OUT':
-                    self.count_out += 1
-
-                # Record event
-                event = {
-                    'frame': frame_num,
-                    'track_id': track_id,
-                    'direction': direction,
-                    'position': center.tolist(),
-                    'count_in': self.count_in,
-                    'count_out': self.count_out
-                }
+        if not tracks:
+            return frame_events
+
+        track_ids = [track['track_id'] for track in tracks]
+        slots = np.fromiter((self._slot(track_id) for track_id in track_ids),
+                            dtype=np.intp, count=len(track_ids))
+
+        # Tracks still in cool-down after a crossing are skipped before any
+        # history update; their next position is compared to the last stored one
+        ready = np.flatnonzero(
+            frame_num - self.last_crossing_frame[slots] >= self.min_frames_between
+        )
+        if ready.size == 0:
+            return frame_events
+
+        slots = slots[ready]
+        centers = np.array([tracks[i]['center'] for i in ready.tolist()], dtype=np.float32)
+
+        # Stitched IDs may appear more than once in a frame; each occurrence
+        # is handled in its own round so the history stays in track order
+        crossed = []
+        for indices in self._split_duplicates(slots):
+            hits, codes = self._advance(frame_num, slots[indices], centers[indices])
+            crossed.extend(zip(indices[hits].tolist(), codes.tolist()))
+        crossed.sort()
+
+        for i, code in crossed:
+            track = tracks[ready[i]]
+            track_id = track_ids[ready[i]]
+            direction = 'IN' if code == CROSSING_IN else 'OUT'
+
+            # Update counters
+            if direction == 'IN':
+                self.count_in += 1
+            else:
+                self.count_out += 1
+
+            # Record event
+            event = {
+                'frame': frame_num,
+                'track_id': track_id,
+                'direction': direction,
+                'position': [float(v) for v in track['center']],
+                'count_in': self.count_in,
+                'count_out': self.count_out
+            }
+            frame_events.append(event)
+
+            self.total_crossings += 1
+            self.crossed_tracks.add(track_id)
+            if self._events_file is not None:
+                self._events_file.write(json.dumps(event) + '\n')
+            else:
                 self.events.append(event)
-                frame_events.append(event)
-
-                # Update last crossing frame
-                self.last_crossing_frame[track_id] = frame_num
 
-                logger.debug(f"Frame {frame_num}: Track {track_id} crossed {direction}")
+            logger.debug(f"Frame {frame_num}: Track {track_id} crossed {direction}")
 
         return frame_events
 
-    def _check_line_crossing(self, pos1: np.ndarray, pos2: np.ndarray) -> Dict:
+    def _advance(self, frame_num: int, slots: np.ndarray,
+                 centers: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Check if trajectory from pos1 to pos2 crosses the line
-        Uses line segment intersection
+        Append positions of distinct slots and check them for crossings
 
         Returns:
-            Dict with crossing info or None
-        """
-        # Check if line segment (pos1, pos2) intersects with counting line
-        if self._segments_intersect(pos1, pos2, self.line_start, self.line_end):
-            # Determine direction based on which side of the line
-            direction = self._get_crossing_direction(pos1, pos2)
-            return {'direction': direction}
-
-        return None
-
-    def _segments_intersect(self, p1: np.ndarray, p2: np.ndarray,
-                           p3: np.ndarray, p4: np.ndarray) -> bool:
-        """
-        Check if line segment p1-p2 intersects with line segment p3-p4
-        """
-        def ccw(A, B, C):
-            return (C[1] - A[1]) * (B[0] - A[0]) > (B[1] - A[1]) * (C[0] - A[0])
-
-        return ccw(p1, p3, p4) != ccw(p2, p3, p4) and ccw(p1, p2, p3) != ccw(p1, p2, p4)
-
-    def _get_crossing_direction(self, pos1: np.ndarray, pos2: np.ndarray) -> str:
+            Indices into slots that crossed the line and their direction codes
         """
-        Determine crossing direction using cross product
-        Positive cross product = left to right / bottom to top = IN
-        Negative = OUT
-        """
-        # Line vector
-        line_vec = self.line_end - self.line_start
-
-        # Movement vector
-        movement_vec = pos2 - pos1
-
-        # Cross product (2D)
-        cross = line_vec[0] * movement_vec[1] - line_vec[1] * movement_vec[0]
-
-        return 'IN' if cross > 0 else 'OUT'
+        # A duplicate ID may have crossed in an earlier round of this frame
+        ready = np.flatnonzero(
+            frame_num - self.last_crossing_frame[slots] >= self.min_frames_between
+        )
+        if ready.size < len(slots):
+            hits, codes = self._advance(frame_num, slots[ready], centers[ready])
+            return ready[hits], codes
+
+        # Add to history
+        heads = self.hist_head[slots]
+        self.hist_xy[slots, heads % self.history_length] = centers
+        heads += 1
+        self.hist_head[slots] = heads
+
+        # Need at least 2 positions to detect crossing
+        candidates = np.flatnonzero(heads >= 2)
+        if candidates.size == 0:
+            return candidates, candidates
+
+        # Get previous positions and check all candidates against the line
+        prev_positions = self.hist_xy[slots[candidates],
+                                      (heads[candidates] - 2) % self.history_length]
+        crossings = check_crossings(prev_positions, centers[candidates],
+                                    self._lx1, self._ly1, self._line_vx, self._line_vy)
+
+        hit = crossings != NO_CROSSING
+        hits = candidates[hit]
+
+        # Update last crossing frame
+        self.last_crossing_frame[slots[hits]] = frame_num
+
+        return hits, crossings[hit]
+
+    @staticmethod
+    def _split_duplicates(slots: np.ndarray) -> List[np.ndarray]:
+        """Split indices into rounds in which every slot appears at most once"""
+        if len(np.unique(slots)) == len(slots):
+            return [np.arange(len(slots))]
+
+        seen = {}
+        rounds = np.empty(len(slots), dtype=np.intp)
+        for i, slot in enumerate(slots.tolist()):
+            rounds[i] = seen.get(slot, 0)
+            seen[slot] = rounds[i] + 1
+
+        return [np.flatnonzero(rounds == r) for r in range(rounds.max() + 1)]
+
+    def _slot(self, track_id: int) -> int:
+        """Get the history slot of a track, allocating one if needed"""
+        slot = self.track_slots.get(track_id)
+        if slot is None:
+            slot = len(self.track_slots)
+            if slot == len(self.hist_head):
+                self._grow()
+            self.track_slots[track_id] = slot
+        return slot
+
+    def _grow(self) -> None:
+        """Double the number of history slots"""
+        capacity = len(self.hist_head)
+
+        hist_xy = np.empty((capacity * 2,) + self.hist_xy.shape[1:], dtype=np.float32)
+        hist_xy[:capacity] = self.hist_xy
+        self.hist_xy = hist_xy
+
+        self.hist_head = np.concatenate([self.hist_head, np.zeros(capacity, dtype=np.int32)])
+        self.last_crossing_frame = np.concatenate([
+            self.last_crossing_frame,
+            np.full(capacity, self.NEVER_CROSSED, dtype=np.int32)
+        ])
 
     def get_summary(self) -> Dict:
         """Get counting summary"""
@@ -159,10 +233,22 @@ class LineCrossingCounter:
             'total_in': self.count_in,
             'total_out': self.count_out,
             'net': self.count_in - self.count_out,
-            'total_crossings': len(self.events),
-            'unique_tracks': len(set(e['track_id'] for e in self.events))
+            'total_crossings': self.total_crossings,
+            'unique_tracks': len(self.crossed_tracks)
         }
 
     def get_events(self) -> List[Dict]:
         """Get all crossing events"""
-        return self.events
\ No newline at end of file
+        if self.events_path is None:
+            return self.events
+
+        if self._events_file is not None:
+            self._events_file.flush()
+        with open(self.events_path, 'r') as f:
+            return [json.loads(line) for line in f]
+
+    def close(self) -> None:
+        """Close the events file"""
+        if self._events_file is not None:
+            self._events_file.close()
+            self._events_file = None
\ No newline at end of file
@@ -0,0 +1,259 @@
+"""
+Threaded frame reading and video writing
+
+Image decoding and video encoding run in background threads connected
+through bounded queues, so they overlap with tracking and drawing.
+OpenCV releases the GIL while decoding and encoding.
+"""
+import os
+import cv2
+import queue
+import threading
+import numpy as np
+from pathlib import Path
+from typing import List, Tuple, Iterator, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Let OpenCV (libjpeg-turbo decoding, drawing) use all cores
+cv2.setNumThreads(cv2.getNumberOfCPUs())
+
+# Enable FFmpeg codec threading for video decoding and encoding; read when
+# a capture or writer is opened, so user settings in the environment win
+os.environ.setdefault('OPENCV_FFMPEG_CAPTURE_OPTIONS', f'threads;{os.cpu_count() or 1}')
+os.environ.setdefault('OPENCV_FFMPEG_WRITER_OPTIONS', f'threads;{os.cpu_count() or 1}')
+
+# Marks the end of a queue
+_END = object()
+
+# cv2.imread flags per read scale; JPEGs are decoded at 1/N resolution
+# directly by libjpeg's DCT scaling
+_READ_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8
+}
+
+
+def imread_flag(read_scale: int = 1) -> int:
+    """cv2.imread flag that decodes images at 1/read_scale resolution"""
+    if read_scale not in _READ_FLAGS:
+        raise ValueError(f"read_scale must be one of {sorted(_READ_FLAGS)}, got {read_scale}")
+    return _READ_FLAGS[read_scale]
+
+
+def read_frames(image_files: List[Path],
+                queue_size: int = 8,
+                read_scale: int = 1) -> Iterator[Tuple[Path, Optional[np.ndarray]]]:
+    """
+    Read images in a background thread, ahead of the consumer
+
+    Args:
+        image_files: Image paths, in the order they are yielded
+        queue_size: Maximum number of decoded frames waiting in memory
+        read_scale: Decode at 1/read_scale resolution (1, 2, 4 or 8)
+
+    Yields:
+        (path, frame) pairs; frame is None if the image could not be read
+    """
+    flag = imread_flag(read_scale)
+    return _prefetch(((path, cv2.imread(str(path), flag)) for path in image_files), queue_size)
+
+
+def read_video_frames(video_path: Path,
+                      max_frames: int = None,
+                      stride: int = 1,
+                      queue_size: int = 8) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Decode a video in a background thread, ahead of the consumer
+
+    Every frame is grabbed, but only every stride-th frame is retrieved,
+    so skipped frames are never fully decoded.
+
+    Args:
+        video_path: Input video path
+        max_frames: Maximum frames to read (None for all)
+        stride: Retrieve every stride-th frame
+        queue_size: Maximum number of decoded frames waiting in memory
+
+    Yields:
+        (frame_idx, frame) pairs with 0-based indices into the video
+    """
+    return _prefetch(_grab_video_frames(video_path, max_frames, max(1, stride)), queue_size)
+
+
+def _grab_video_frames(video_path: Path, max_frames: int,
+                       stride: int) -> Iterator[Tuple[int, np.ndarray]]:
+    """Grab frames from a video and retrieve every stride-th one"""
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video: {video_path}")
+
+    try:
+        frame_idx = 0
+        while (not max_frames or frame_idx < max_frames) and cap.grab():
+            if frame_idx % stride == 0:
+                ok, frame = cap.retrieve()
+                if not ok:
+                    break
+                yield frame_idx, frame
+            frame_idx += 1
+    finally:
+        cap.release()
+
+
+def _prefetch(items: Iterator, queue_size: int) -> Iterator:
+    """
+    Run an iterator in a background thread and yield its items
+
+    The thread stops when the returned generator is closed; errors
+    raised by the iterator are re-raised in the consumer.
+    """
+    item_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        # Give up when the consumer has stopped iterating
+        while not stop.is_set():
+            try:
+                item_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def producer():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except Exception as e:
+            put(e)
+        finally:
+            # Release resources held by the iterator (e.g. a VideoCapture)
+            close = getattr(items, 'close', None)
+            if close is not None:
+                close()
+        put(_END)
+
+    thread = threading.Thread(target=producer, name='frame-reader', daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = item_queue.get()
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def open_video_writer(output_path: Path,
+                      fps: int,
+                      frame_size: Tuple[int, int],
+                      hw_accel: bool = True) -> cv2.VideoWriter:
+    """
+    Open a video writer, preferring hardware H.264 encoding
+
+    With hw_accel, FFmpeg is asked for an accelerated H.264 (avc1) encoder
+    (NVENC, QSV or VAAPI, depending on the OpenCV build and the machine).
+    If that cannot be opened, the software MPEG-4 (mp4v) encoder is used.
+
+    Args:
+        output_path: Output video path
+        fps: Frames per second
+        frame_size: (width, height) of the frames
+        hw_accel: Whether to try the hardware encoder
+
+    Returns:
+        Opened cv2.VideoWriter
+    """
+    if hw_accel:
+        writer = cv2.VideoWriter(
+            str(output_path), cv2.CAP_FFMPEG, cv2.VideoWriter_fourcc(*'avc1'), fps, frame_size,
+            [cv2.VIDEOWRITER_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        )
+        if writer.isOpened():
+            logger.info(f"Encoding {output_path.name} with H.264 (avc1)")
+            return writer
+        writer.release()
+        logger.info("Hardware H.264 encoder unavailable, falling back to mp4v")
+
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    return cv2.VideoWriter(str(output_path), fourcc, fps, frame_size)
+
+
+class FrameWriter:
+    """
+    cv2.VideoWriter that encodes frames in a background thread
+
+    Frames must not be modified after they are passed to write().
+    """
+
+    def __init__(self,
+                 output_path: Path,
+                 fps: int,
+                 frame_size: Tuple[int, int],
+                 queue_size: int = 8,
+                 hw_accel: bool = True):
+        """
+        Args:
+            output_path: Output video path
+            fps: Frames per second
+            frame_size: (width, height) of the frames
+            queue_size: Maximum number of frames waiting to be encoded
+            hw_accel: Try a hardware H.264 encoder before software MPEG-4
+        """
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        self._writer = open_video_writer(output_path, fps, frame_size, hw_accel)
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='frame-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, frame: np.ndarray) -> None:
+        """Queue a frame for encoding"""
+        if self._error is not None:
+            raise self._error
+        self._queue.put(frame)
+
+    def release(self) -> None:
+        """Encode the remaining frames and close the video"""
+        if self._thread is None:
+            return
+
+        self._queue.put(_END)
+        self._thread.join()
+        self._thread = None
+        self._writer.release()
+
+        if self._error is not None:
+            raise self._error
+
+    def _run(self) -> None:
+        """Encode queued frames until the end marker"""
+        while True:
+            frame = self._queue.get()
+            if frame is _END:
+                return
+            if self._error is not None:
+                # Keep draining so write() never blocks
+                continue
+            try:
+                self._writer.write(frame)
+            except Exception as e:
+                logger.error(f"Video encoding failed: {e}")
+                self._error = e
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
@@ -0,0 +1,69 @@
+"""
+Per-frame tracking results stored as NumPy arrays
+"""
+import numpy as np
+from dataclasses import dataclass
+from typing import List, Dict
+
+
+@dataclass
+class FrameResult:
+    """
+    Tracks of one frame as parallel arrays (structure of arrays)
+
+    Row i of every array describes the same track.
+    """
+    frame: int
+    boxes: np.ndarray    # (N, 4) float32: x1, y1, x2, y2
+    ids: np.ndarray      # (N,) int32 track IDs
+    confs: np.ndarray    # (N,) float32 confidences
+    centers: np.ndarray  # (N, 2) float32 bbox centers
+
+    @classmethod
+    def from_arrays(cls, frame: int, boxes: np.ndarray, ids: np.ndarray,
+                    confs: np.ndarray) -> 'FrameResult':
+        """Build a frame result, computing all centers at once"""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        return cls(
+            frame=frame,
+            boxes=boxes,
+            ids=np.asarray(ids).astype(np.int32),
+            confs=np.asarray(confs, dtype=np.float32),
+            centers=(boxes[:, :2] + boxes[:, 2:]) / 2
+        )
+
+    @classmethod
+    def empty(cls, frame: int) -> 'FrameResult':
+        """Frame without tracks"""
+        return cls.from_arrays(frame, np.empty((0, 4)), np.empty(0), np.empty(0))
+
+    @classmethod
+    def from_dicts(cls, frame: int, tracks: List[Dict]) -> 'FrameResult':
+        """Build a frame result from track dictionaries"""
+        if not tracks:
+            return cls.empty(frame)
+
+        return cls(
+            frame=frame,
+            boxes=np.array([track['bbox'] for track in tracks], dtype=np.float32),
+            ids=np.array([track['track_id'] for track in tracks], dtype=np.int32),
+            confs=np.array([track['confidence'] for track in tracks], dtype=np.float32),
+            centers=np.array([track['center'] for track in tracks], dtype=np.float32)
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def to_dicts(self) -> List[Dict]:
+        """Convert to the list of track dictionaries used by counter, stitcher and visualizer"""
+        return [
+            {
+                'frame': self.frame,
+                'track_id': track_id,
+                'bbox': bbox,
+                'center': center,
+                'confidence': conf
+            }
+            for track_id, bbox, center, conf in zip(self.ids.tolist(), self.boxes.tolist(),
+                                                    self.centers.tolist(), self.confs.tolist())
+        ]
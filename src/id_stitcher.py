@@ -2,19 +2,121 @@
 Post-processing module to fix ID switches and merge fragmented tracks
 """
 import numpy as np
-from typing import List, Dict, Set, Tuple
-from collections import defaultdict
+from typing import List, Dict, Set, Tuple, Iterable, Iterator, Optional
+from collections import defaultdict, deque
+from bisect import bisect_left
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+class DisjointSet:
+    """
+    Union-find over track IDs with path halving and union by rank
+
+    Each set is labelled with its smallest track ID, i.e. the fragment
+    the tracker created first. IDs added with a frame span are only merged
+    if the sets' spans do not overlap, so two tracks alive at the same
+    time never end up with the same ID.
+    """
+
+    def __init__(self):
+        self.parent = {}
+        self.rank = {}
+        self.label = {}
+        # root -> (first frame, last frame) of the set
+        self.span = {}
+
+    def __len__(self) -> int:
+        """Number of IDs merged into another set"""
+        return len(self.parent) - len(self.label)
+
+    def find(self, track_id: int) -> int:
+        """Get the label of the set containing track_id"""
+        root = self._root(track_id)
+        return self.label.get(root, root)
+
+    def add(self, track_id: int, first_frame: int = None, last_frame: int = None) -> None:
+        """Add track_id as its own set, optionally with the frames it spans"""
+        if track_id in self.parent:
+            return
+
+        self.parent[track_id] = track_id
+        self.rank[track_id] = 0
+        self.label[track_id] = track_id
+        if first_frame is not None:
+            self.span[track_id] = (first_frame, last_frame)
+
+    def extend(self, track_id: int, frame_num: int) -> None:
+        """Extend the frame span of the set containing track_id up to frame_num"""
+        root = self._root(track_id)
+        first_frame, last_frame = self.span[root]
+        if frame_num > last_frame:
+            self.span[root] = (first_frame, frame_num)
+
+    def last_frame(self, track_id: int) -> Optional[int]:
+        """Get the last frame of the set containing track_id, if it has a span"""
+        span = self.span.get(self._root(track_id))
+        return span[1] if span is not None else None
+
+    def union(self, track_id_a: int, track_id_b: int) -> bool:
+        """
+        Merge the sets containing both IDs
+
+        Returns:
+            False if they were already in the same set or their frame spans overlap
+        """
+        self.add(track_id_a)
+        self.add(track_id_b)
+
+        root_a = self._root(track_id_a)
+        root_b = self._root(track_id_b)
+        if root_a == root_b:
+            return False
+
+        span_a = self.span.get(root_a)
+        span_b = self.span.get(root_b)
+        if span_a is not None and span_b is not None:
+            if span_a[0] <= span_b[1] and span_b[0] <= span_a[1]:
+                return False
+
+        if self.rank[root_a] < self.rank[root_b]:
+            root_a, root_b = root_b, root_a
+
+        self.parent[root_b] = root_a
+        if self.rank[root_a] == self.rank[root_b]:
+            self.rank[root_a] += 1
+        self.label[root_a] = min(self.label[root_a], self.label.pop(root_b))
+        if span_a is not None and span_b is not None:
+            del self.span[root_b]
+            self.span[root_a] = (min(span_a[0], span_b[0]), max(span_a[1], span_b[1]))
+
+        return True
+
+    def _root(self, track_id: int) -> int:
+        """Find the root of track_id, halving the path on the way"""
+        parent = self.parent
+        if track_id not in parent:
+            return track_id
+
+        while parent[track_id] != track_id:
+            parent[track_id] = parent[parent[track_id]]
+            track_id = parent[track_id]
+        return track_id
+
+
 class TrackIDStitcher:
     """
     Post-process tracking results to merge fragmented tracks
     and fix ID switches caused by occlusion
+
+    Works offline on a whole sequence (stitch_tracks) or online,
+    frame by frame, while tracking is running (update / stream).
     """
 
+    # IDs given to tracks split off from a merge set, above any tracker ID
+    SPLIT_ID_BASE = 1_000_000
+
     def __init__(self,
                  max_frame_gap: int = 30,
                  position_threshold: float = 150.0,
@@ -29,15 +131,268 @@ class TrackIDStitcher:
         self.position_threshold = position_threshold
         self.size_similarity_threshold = size_similarity_threshold
 
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear the state of online stitching"""
+        # Disjoint sets of merges that can no longer be undone
+        self.merges = DisjointSet()
+
+        # Track IDs seen so far: track_id -> last frame it was seen in
+        self._last_seen = {}
+
+        # Tracker IDs that came back while their merge set lived on
+        # under another track: tracker ID -> split-off ID
+        self._split_ids = {}
+        self._next_split_id = self.SPLIT_ID_BASE
+
+        # Merges that are undone if the earlier track comes back:
+        # master_id -> (continuing track_id, master end frame)
+        self._continued_by = {}
+        # Continuing track IDs of those merges
+        self._provisional = set()
+
+        # Tracks seen in the previous frame: track_id -> (frame, x, y, size)
+        self._active = {}
+
+        # Lost tracks that may still be continued, bucketed by grid cell
+        self._lost_cells = defaultdict(dict)
+        self._lost_cell_of = {}
+        self._lost_order = deque()
+
+    def update(self, frame_num: int, tracks: List[Dict]) -> List[Dict]:
+        """
+        Stitch one frame online and remap its track IDs in place
+
+        A track ID seen for the first time continues the closest lost track
+        that ended at most max_frame_gap frames earlier, if position and bbox
+        size match. Each lost track can be continued only once. The merge is
+        provisional until the lost track has been gone for max_frame_gap
+        frames; if it comes back before that, the merge is undone. If it comes
+        back after that while its continuation is still alive, it is split
+        off to a new ID. max_frame_gap should therefore be larger than the
+        number of frames the tracker keeps lost tracks for.
+
+        Only final merges are applied to the returned tracks, so a
+        continuing track keeps its own ID until its merge is final.
+        Use stream() to get every frame with its final IDs.
+
+        Args:
+            frame_num: Current frame number
+            tracks: List of track dictionaries with 'track_id', 'center' and 'bbox'
+
+        Returns:
+            The same tracks with merged IDs and a 'stitched' flag
+        """
+        self._observe(frame_num, tracks)
+        self._remap(tracks)
+        return tracks
+
+    def stream(self, tracking_results: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Stitch frames online as they arrive
+
+        Frames with a track whose merge is still provisional are held back,
+        together with all later frames, until the merge is final or undone
+        (at most max_frame_gap frames). Downstream consumers such as the
+        counter therefore never see an ID that is taken back later.
+
+        Args:
+            tracking_results: Per-frame tracking results, in frame order
+
+        Yields:
+            Each frame's results with merged IDs, in frame order
+        """
+        pending = deque()
+        for frame_data in tracking_results:
+            self._observe(frame_data['frame'], frame_data['tracks'])
+            pending.append(frame_data)
+            yield from self._release(pending)
+
+        # No lost track can come back after the last frame
+        self._finalize_merges()
+        yield from self._release(pending)
+
+    def _observe(self, frame_num: int, tracks: List[Dict]) -> None:
+        """Update lost tracks and merges with one frame, without remapping it"""
+        self._expire_lost(frame_num)
+
+        # Tracks missing from this frame are lost from now on; indexed before
+        # matching, so a new ID can continue a track that vanished just now
+        current_ids = {self._split_ids.get(track['track_id'], track['track_id'])
+                       for track in tracks}
+        for track_id, sighting in self._active.items():
+            if track_id not in current_ids:
+                self._add_lost(track_id, sighting)
+
+        active = {}
+        for track in tracks:
+            tracker_id = track['track_id']
+            track_id = self._split_ids.get(tracker_id, tracker_id)
+            if track_id not in self._active and self._is_reused(track_id, frame_num):
+                # Its merge set lives on under a track seen after it, so this
+                # is another person now; continuing as the set would give two
+                # people the same ID
+                track_id = self._split_ids[tracker_id] = self._next_split_id
+                self._next_split_id += 1
+                logger.debug(f"Frame {frame_num}: Track {tracker_id} came back after its merge, "
+                             f"splitting it off as {track_id}")
+            track['track_id'] = track_id
+
+            x, y = track['center']
+            x1, y1, x2, y2 = track['bbox']
+            size = (x2 - x1) * (y2 - y1)
+
+            if track_id not in self._last_seen:
+                self.merges.add(track_id, frame_num, frame_num)
+                match = self._match_lost(frame_num, x, y, size)
+                if match is not None:
+                    master_id, end_frame = match
+                    self._continued_by[master_id] = (track_id, end_frame)
+                    self._provisional.add(track_id)
+                    logger.debug(f"Frame {frame_num}: Merging track {track_id} into {master_id}")
+            else:
+                # Known track; if it was lost, it came back by itself
+                self._remove_lost(track_id)
+                continuation = self._continued_by.pop(track_id, None)
+                if continuation is not None:
+                    self._provisional.discard(continuation[0])
+                    logger.debug(f"Frame {frame_num}: Track {track_id} came back, "
+                                 f"undoing merge of {continuation[0]}")
+
+            self._last_seen[track_id] = frame_num
+            self.merges.extend(track_id, frame_num)
+            active[track_id] = (frame_num, x, y, size)
+
+        self._active = active
+
+    def _is_reused(self, track_id: int, frame_num: int) -> bool:
+        """
+        Check if a returning track's merge set was continued by another track
+        that was seen after it and may still be alive
+        """
+        last_seen = self._last_seen.get(track_id)
+        if last_seen is None:
+            return False
+
+        set_last_frame = self.merges.last_frame(track_id)
+        return set_last_frame > last_seen and frame_num - set_last_frame <= self.max_frame_gap
+
+    def _release(self, pending: deque) -> Iterator[Dict]:
+        """Remap and yield held frames up to the first one with a provisional merge"""
+        while pending and not any(track['track_id'] in self._provisional
+                                  for track in pending[0]['tracks']):
+            frame_data = pending.popleft()
+            self._remap(frame_data['tracks'])
+            yield frame_data
+
+    def _remap(self, tracks: List[Dict]) -> None:
+        """Replace track IDs in place by the label of their final merge set"""
+        for track in tracks:
+            track_id = track['track_id']
+            new_id = self.merges.find(track_id)
+            track['stitched'] = new_id != track_id
+            track['track_id'] = new_id
+
+    def _match_lost(self, frame_num: int, x: float, y: float,
+                    size: float) -> Optional[Tuple[int, int]]:
+        """
+        Find and consume the closest lost track that a new track continues
+
+        Returns:
+            (track_id, end_frame) of the lost track, or None
+        """
+        cell_x = int(x // self.position_threshold)
+        cell_y = int(y // self.position_threshold)
+
+        best_id = None
+        best_dist2 = self.position_threshold ** 2
+
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                bucket = self._lost_cells.get((cell_x + dx, cell_y + dy))
+                if not bucket:
+                    continue
+
+                for track_id, (end_frame, end_x, end_y, end_size) in bucket.items():
+                    if frame_num - end_frame > self.max_frame_gap:
+                        continue
+
+                    dist2 = (end_x - x) ** 2 + (end_y - y) ** 2
+                    if dist2 >= best_dist2:
+                        continue
+
+                    larger = max(size, end_size)
+                    if larger <= 0 or min(size, end_size) / larger <= self.size_similarity_threshold:
+                        continue
+
+                    best_id = track_id
+                    best_end = end_frame
+                    best_dist2 = dist2
+
+        if best_id is None:
+            return None
+
+        self._remove_lost(best_id)
+        return best_id, best_end
+
+    def _add_lost(self, track_id: int, sighting: Tuple[int, float, float, float]) -> None:
+        """Index a track that was not seen in the current frame"""
+        end_frame, x, y, _ = sighting
+        cell = (int(x // self.position_threshold), int(y // self.position_threshold))
+
+        self._lost_cells[cell][track_id] = sighting
+        self._lost_cell_of[track_id] = cell
+        self._lost_order.append((end_frame, track_id))
+
+    def _remove_lost(self, track_id: int) -> None:
+        """Drop a track from the lost index if it is there"""
+        cell = self._lost_cell_of.pop(track_id, None)
+        if cell is None:
+            return
+
+        bucket = self._lost_cells[cell]
+        del bucket[track_id]
+        if not bucket:
+            del self._lost_cells[cell]
+
+    def _expire_lost(self, frame_num: int) -> None:
+        """
+        Forget lost tracks that ended more than max_frame_gap frames ago
+
+        Merges into such tracks can no longer be undone and are moved
+        to the disjoint sets.
+        """
+        while self._lost_order and frame_num - self._lost_order[0][0] > self.max_frame_gap:
+            end_frame, track_id = self._lost_order.popleft()
+
+            # Entries of tracks that came back and were lost again are stale
+            cell = self._lost_cell_of.get(track_id)
+            if cell is not None and self._lost_cells[cell][track_id][0] == end_frame:
+                self._remove_lost(track_id)
+
+            continuation = self._continued_by.get(track_id)
+            if continuation is not None and continuation[1] == end_frame:
+                del self._continued_by[track_id]
+                self._provisional.discard(continuation[0])
+                self.merges.union(track_id, continuation[0])
+
+    def _finalize_merges(self) -> None:
+        """Make all provisional merges final, e.g. after the last frame"""
+        for master_id, (track_id, _) in self._continued_by.items():
+            self.merges.union(master_id, track_id)
+        self._continued_by.clear()
+        self._provisional.clear()
+
     def stitch_tracks(self, tracking_results: List[Dict]) -> List[Dict]:
         """
         Merge fragmented tracks that likely belong to the same person
 
         Args:
-            tracking_results: Original tracking results
+            tracking_results: Original tracking results, modified in place
 
         Returns:
-            Modified tracking results with merged IDs
+            The same tracking results with merged IDs
         """
         logger.info("Starting track stitching...")
 
@@ -45,165 +400,190 @@ class TrackIDStitcher:
         track_segments = self._build_track_segments(tracking_results)
 
         # Find merge candidates
-        merge_map = self._find_merge_candidates(track_segments)
+        merges = self._find_merge_candidates(track_segments)
 
         # Apply ID mapping
-        stitched_results = self._apply_id_mapping(tracking_results, merge_map)
+        stitched_results = self._apply_id_mapping(tracking_results, merges)
 
-        logger.info(f"Stitched {len(merge_map)} track fragments")
+        logger.info(f"Stitched {len(merges)} track fragments")
 
         return stitched_results
 
-    def _build_track_segments(self, results: List[Dict]) -> Dict:
+    def _build_track_segments(self, results: List[Dict]) -> Dict[str, np.ndarray]:
         """
         Build track segments with start/end frames and positions
 
+        All tracks are flattened into arrays once and grouped by track ID
+        with a stable sort, so each segment's start is the first row of its
+        group and its end is the first row with the group's last frame.
+
         Returns:
-            Dict mapping track_id to segment info
-        """
-        segments = defaultdict(lambda: {
-            'start_frame': float('inf'),
-            'end_frame': 0,
-            'start_position': None,
-            'end_position': None,
-            'start_bbox': None,
-            'end_bbox': None,
-            'frames': []
-        })
+            Dict of per-segment arrays: 'track_id', 'start_frame',
+            'end_frame', 'start_position', 'end_position', 'start_bbox',
+            'end_bbox', 'start_size' and 'end_size' (bbox areas)
+        """
+        frames = []
+        track_ids = []
+        centers = []
+        bboxes = []
 
         for frame_data in results:
             frame_num = frame_data['frame']
             for track in frame_data['tracks']:
-                track_id = track['track_id']
-                center = track['center']
-                bbox = track['bbox']
+                frames.append(frame_num)
+                track_ids.append(track['track_id'])
+                centers.append(track['center'])
+                bboxes.append(track['bbox'])
 
-                seg = segments[track_id]
-                seg['frames'].append(frame_num)
+        # Pixel coordinates and frame numbers fit in 32 bits
+        frames = np.array(frames, dtype=np.int32)
+        track_ids = np.array(track_ids, dtype=np.int32)
+        centers = np.array(centers, dtype=np.float32).reshape(-1, 2)
+        bboxes = np.array(bboxes, dtype=np.float32).reshape(-1, 4)
 
-                # Update start
-                if frame_num < seg['start_frame']:
-                    seg['start_frame'] = frame_num
-                    seg['start_position'] = center
-                    seg['start_bbox'] = bbox
+        # Rows grouped by track, earliest frame first / latest frame first
+        by_start = np.lexsort((frames, track_ids))
+        by_end = np.lexsort((-frames, track_ids))
 
-                # Update end
-                if frame_num > seg['end_frame']:
-                    seg['end_frame'] = frame_num
-                    seg['end_position'] = center
-                    seg['end_bbox'] = bbox
+        unique_ids, group_start = np.unique(track_ids[by_start], return_index=True)
+        start_rows = by_start[group_start]
+        end_rows = by_end[group_start]
 
-        return dict(segments)
+        # Bbox areas, computed once for all candidate pairs
+        sizes = (bboxes[:, 2] - bboxes[:, 0]) * (bboxes[:, 3] - bboxes[:, 1])
 
-    def _find_merge_candidates(self, segments: Dict) -> Dict[int, int]:
+        return {
+            'track_id': unique_ids,
+            'start_frame': frames[start_rows],
+            'end_frame': frames[end_rows],
+            'start_position': centers[start_rows],
+            'end_position': centers[end_rows],
+            'start_bbox': bboxes[start_rows],
+            'end_bbox': bboxes[end_rows],
+            'start_size': sizes[start_rows],
+            'end_size': sizes[end_rows]
+        }
+
+    def _find_merge_candidates(self, segments: Dict[str, np.ndarray]) -> DisjointSet:
         """
         Find tracks that should be merged based on spatial-temporal proximity
 
         Returns:
-            Mapping from old_id to new_id (master)
-        """
-        merge_map = {}
-        track_ids = sorted(segments.keys())
-
-        for i, track_id_a in enumerate(track_ids):
-            seg_a = segments[track_id_a]
-
-            for track_id_b in track_ids[i + 1:]:
-                seg_b = segments[track_id_b]
-
-                # Check if one track starts shortly after another ends
-                should_merge = False
-
-                # Case 1: A ends, then B starts
-                if seg_a['end_frame'] < seg_b['start_frame']:
-                    frame_gap = seg_b['start_frame'] - seg_a['end_frame']
-                    if frame_gap <= self.max_frame_gap:
-                        # Check position proximity
-                        dist = np.linalg.norm(
-                            np.array(seg_a['end_position']) -
-                            np.array(seg_b['start_position'])
-                        )
-
-                        # Check size similarity
-                        size_a = self._get_bbox_size(seg_a['end_bbox'])
-                        size_b = self._get_bbox_size(seg_b['start_bbox'])
-                        size_ratio = min(size_a, size_b) / max(size_a, size_b)
-
-                        if (dist < self.position_threshold and
-                                size_ratio > self.size_similarity_threshold):
-                            should_merge = True
-                            master_id = track_id_a
-                            slave_id = track_id_b
-
-                # Case 2: B ends, then A starts
-                elif seg_b['end_frame'] < seg_a['start_frame']:
-                    frame_gap = seg_a['start_frame'] - seg_b['end_frame']
-                    if frame_gap <= self.max_frame_gap:
-                        dist = np.linalg.norm(
-                            np.array(seg_b['end_position']) -
-                            np.array(seg_a['start_position'])
-                        )
-
-                        size_a = self._get_bbox_size(seg_a['start_bbox'])
-                        size_b = self._get_bbox_size(seg_b['end_bbox'])
-                        size_ratio = min(size_a, size_b) / max(size_a, size_b)
-
-                        if (dist < self.position_threshold and
-                                size_ratio > self.size_similarity_threshold):
-                            should_merge = True
-                            master_id = track_id_b
-                            slave_id = track_id_a
-
-                if should_merge:
-                    # Avoid creating chains, use transitive closure
-                    final_master = self._get_master_id(master_id, merge_map)
-                    merge_map[slave_id] = final_master
-                    logger.debug(f"Merging track {slave_id} into {final_master}")
-
-        return merge_map
-
-    def _get_master_id(self, track_id: int, merge_map: Dict[int, int]) -> int:
-        """Get the ultimate master ID following the chain"""
-        while track_id in merge_map:
-            track_id = merge_map[track_id]
-        return track_id
+            Disjoint sets of track IDs that belong to the same person
+        """
+        merges = DisjointSet()
+
+        master_idx, slave_idx = self._broad_phase(segments)
+        if len(master_idx) == 0:
+            return merges
+
+        # Check position proximity (squared, no sqrt needed)
+        dist2 = ((segments['end_position'][master_idx] -
+                  segments['start_position'][slave_idx]) ** 2).sum(axis=1)
+
+        # Check size similarity
+        size_a = segments['end_size'][master_idx]
+        size_b = segments['start_size'][slave_idx]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            size_ratio = np.minimum(size_a, size_b) / np.maximum(size_a, size_b)
+
+        should_merge = ((dist2 < self.position_threshold ** 2) &
+                        (size_ratio > self.size_similarity_threshold))
+
+        track_ids = segments['track_id']
+        start_frames = segments['start_frame']
+        end_frames = segments['end_frame']
+        for i in np.flatnonzero(should_merge):
+            master, slave = master_idx[i], slave_idx[i]
+            master_id = int(track_ids[master])
+            slave_id = int(track_ids[slave])
+
+            # Sets of tracks that were visible at the same time are never merged
+            merges.add(master_id, int(start_frames[master]), int(end_frames[master]))
+            merges.add(slave_id, int(start_frames[slave]), int(end_frames[slave]))
+            if merges.union(master_id, slave_id):
+                logger.debug(f"Merging track {slave_id} into {merges.find(slave_id)}")
+
+        return merges
+
+    def _broad_phase(self, segments: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find (master, slave) pairs where the slave starts shortly after the
+        master ends, close enough to be in a neighbouring grid cell
 
-    def _get_bbox_size(self, bbox: List[float]) -> float:
-        """Calculate bbox area"""
-        x1, y1, x2, y2 = bbox
-        return (x2 - x1) * (y2 - y1)
+        Track ends are bucketed in a spatial hash with cells of
+        position_threshold pixels, sorted by end frame, so each track start
+        only looks at the 3x3 cells around it and the frames in the gap window.
 
-    def _apply_id_mapping(self, results: List[Dict], merge_map: Dict[int, int]) -> List[Dict]:
+        Returns:
+            Segment indices of masters and slaves, ordered by
+            (smaller track id, larger track id)
         """
-        Apply ID mapping to tracking results
+        end_cells = defaultdict(list)
+        for i, (cell, end_frame) in enumerate(zip(self._cells(segments['end_position']),
+                                                  segments['end_frame'].tolist())):
+            end_cells[cell].append((end_frame, i))
+        for bucket in end_cells.values():
+            bucket.sort()
+
+        pairs = []
+        for slave, ((cell_x, cell_y), start_frame) in enumerate(zip(
+                self._cells(segments['start_position']), segments['start_frame'].tolist())):
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    bucket = end_cells.get((cell_x + dx, cell_y + dy))
+                    if not bucket:
+                        continue
+
+                    # Masters that end within max_frame_gap before this start
+                    lo = bisect_left(bucket, (start_frame - self.max_frame_gap,))
+                    hi = bisect_left(bucket, (start_frame,))
+                    pairs.extend((master, slave) for _, master in bucket[lo:hi])
+
+        # Keep the pair order of a full pairwise scan so merges resolve the same way
+        track_ids = segments['track_id'].tolist()
+        pairs.sort(key=lambda pair: (min(track_ids[pair[0]], track_ids[pair[1]]),
+                                     max(track_ids[pair[0]], track_ids[pair[1]])))
+
+        pairs = np.array(pairs, dtype=np.intp).reshape(-1, 2)
+        return pairs[:, 0], pairs[:, 1]
+
+    def _cells(self, positions: np.ndarray) -> List[Tuple[int, int]]:
+        """Spatial hash cells of (N, 2) positions"""
+        cells = np.floor_divide(positions, self.position_threshold).astype(np.int32)
+        return [tuple(cell) for cell in cells.tolist()]
+
+    def _apply_id_mapping(self, results: List[Dict], merges: DisjointSet) -> List[Dict]:
         """
-        # Expand merge map with transitive closure
-        expanded_map = {}
-        for old_id in merge_map:
-            expanded_map[old_id] = self._get_master_id(old_id, merge_map)
+        Apply ID mapping to tracking results in place
+
+        Returns:
+            The same results list with remapped track IDs
+        """
+        # Lookup table old_id -> new_id, resolving each merged ID once
+        max_id = max((track['track_id'] for frame_data in results
+                      for track in frame_data['tracks']), default=0)
+        remap = np.arange(max_id + 1, dtype=np.int32)
+        for old_id in merges.parent:
+            if old_id <= max_id:
+                remap[old_id] = merges.find(old_id)
 
         # Apply mapping
-        stitched_results = []
         for frame_data in results:
-            new_tracks = []
-            for track in frame_data['tracks']:
-                track_id = track['track_id']
+            tracks = frame_data['tracks']
+            if not tracks:
+                continue
 
-                # Replace ID if needed
-                if track_id in expanded_map:
-                    track['track_id'] = expanded_map[track_id]
-                    track['stitched'] = True
-                else:
-                    track['stitched'] = False
+            old_ids = np.fromiter((track['track_id'] for track in tracks),
+                                  dtype=np.int32, count=len(tracks))
+            new_ids = remap[old_ids]
 
-                new_tracks.append(track)
+            for track, new_id, stitched in zip(tracks, new_ids.tolist(),
+                                               (new_ids != old_ids).tolist()):
+                track['track_id'] = new_id
+                track['stitched'] = stitched
 
-            stitched_results.append({
-                **frame_data,
-                'tracks': new_tracks
-            })
-
-        return stitched_results
+        return results
 
     def get_statistics(self, original_results: List[Dict],
                        stitched_results: List[Dict]) -> Dict:
@@ -221,9 +601,23 @@ class TrackIDStitcher:
         original_count = count_unique_ids(original_results)
         stitched_count = count_unique_ids(stitched_results)
 
+        return self._statistics(original_count, stitched_count)
+
+    def get_online_statistics(self) -> Dict:
+        """
+        Compare track IDs seen so far by update with the IDs of their final merge sets
+        """
+        original_count = len(self._last_seen)
+        stitched_count = len({self.merges.find(track_id) for track_id in self._last_seen})
+
+        return self._statistics(original_count, stitched_count)
+
+    def _statistics(self, original_count: int, stitched_count: int) -> Dict:
+        """Build the statistics dict from unique ID counts"""
         return {
             'original_unique_ids': original_count,
             'stitched_unique_ids': stitched_count,
             'ids_merged': original_count - stitched_count,
-            'reduction_percentage': (original_count - stitched_count) / original_count * 100
-        }
\ No newline at end of file
+            'reduction_percentage': ((original_count - stitched_count) / original_count * 100
+                                     if original_count else 0.0)
+        }
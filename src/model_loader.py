@@ -0,0 +1,109 @@
+"""
+YOLO model loading with an optional TensorRT FP16 engine, and tracker setup
+"""
+import yaml
+from pathlib import Path
+from typing import Optional
+import logging
+
+from ultralytics import YOLO
+from ultralytics.trackers.track import TRACKER_MAP
+from ultralytics.utils import IterableSimpleNamespace
+from ultralytics.utils.checks import check_yaml
+
+logger = logging.getLogger(__name__)
+
+try:
+    import torch
+    # Allow TF32 Tensor Core matmuls for the layers that stay in PyTorch
+    torch.set_float32_matmul_precision('high')
+    # Input shapes are fixed by imgsz, so let cuDNN pick the fastest convolutions once
+    torch.backends.cudnn.benchmark = True
+except ImportError:  # pragma: no cover - ultralytics depends on torch
+    torch = None
+
+
+def export_engine(model_name: str, imgsz: int = 640, batch_size: int = 1) -> Optional[Path]:
+    """
+    Export a TensorRT FP16 engine next to the .pt weights, once
+
+    The engine has a dynamic input shape up to batch_size frames of
+    imgsz x imgsz, so micro-batches and letterboxed frames of any
+    smaller size can be passed to it.
+
+    Args:
+        model_name: YOLO weights file (e.g. 'yolo11n.pt' -> 'yolo11n_b8_640.engine')
+        imgsz: Largest inference size the engine accepts
+        batch_size: Largest number of frames per call the engine accepts
+
+    Returns:
+        Path of the engine, or None without a CUDA device or if the export fails
+    """
+    if torch is None or not torch.cuda.is_available():
+        logger.info(f"No CUDA device available, skipping TensorRT export of {model_name}")
+        return None
+
+    # The engine only fits the batch size and input size it was built for
+    weights = Path(model_name)
+    engine_path = weights.with_name(f"{weights.stem}_b{batch_size}_{imgsz}.engine")
+    if engine_path.exists():
+        return engine_path
+
+    try:
+        logger.info(f"Exporting {model_name} to TensorRT FP16 engine (one-time)...")
+        exported = YOLO(model_name).export(format='engine', half=True, imgsz=imgsz,
+                                           dynamic=True, batch=batch_size, device=0)
+        return Path(exported).replace(engine_path)
+    except Exception as e:
+        logger.warning(f"TensorRT export of {model_name} failed: {e}")
+        return None
+
+
+def load_model(model_name: str, use_tensorrt: bool = True, imgsz: int = 640,
+               batch_size: int = 1) -> YOLO:
+    """
+    Load a YOLO model, preferring a TensorRT FP16 engine on CUDA devices
+
+    Without a GPU, or if the engine cannot be exported or loaded,
+    the PyTorch weights are used.
+
+    Args:
+        model_name: YOLO weights file (e.g. 'yolo11n.pt')
+        use_tensorrt: Whether to try the TensorRT engine
+        imgsz: Inference size the engine is built for
+        batch_size: Frames per call the engine is built for
+
+    Returns:
+        Loaded YOLO model
+    """
+    if use_tensorrt:
+        engine_path = export_engine(model_name, imgsz, batch_size)
+        if engine_path is not None:
+            try:
+                engine = YOLO(str(engine_path), task='detect')
+                logger.info(f"Loaded TensorRT engine: {engine_path}")
+                return engine
+            except Exception as e:
+                logger.warning(f"Could not load {engine_path} ({e}), using PyTorch weights")
+
+    return YOLO(model_name)
+
+
+def load_tracker(tracker_config: str):
+    """
+    Create an Ultralytics BoT-SORT or ByteTrack tracker from its YAML config
+
+    The tracker is kept by the caller and updated with each frame's
+    detections, so the config is read once instead of on every
+    model.track() call.
+
+    Args:
+        tracker_config: Tracker YAML name or path (e.g. 'botsort.yaml')
+
+    Returns:
+        Tracker whose update(detections, image) returns rows of
+        x1, y1, x2, y2, track_id, score, cls, detection index
+    """
+    with open(check_yaml(tracker_config)) as f:
+        tracker_args = IterableSimpleNamespace(**yaml.safe_load(f))
+    return TRACKER_MAP[tracker_args.tracker_type](args=tracker_args)
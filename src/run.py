@@ -8,17 +8,21 @@ This will run both combinations:
 1. YOLO11n + BoT-SORT + ID Stitching
 2. YOLO11s + ByteTrack (default YOLO tracker)
 """
+import os
+import csv
 import yaml
 import json
+import queue
 import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
-import pandas as pd
 
 from tracker_botsort import PersonTrackerBoTSORT
 from tracker_bytetrack import PersonTrackerByteTrack
 from counter import LineCrossingCounter
 from visualizer import TrackingVisualizer
 from id_stitcher import TrackIDStitcher
+from model_loader import export_engine
 
 logging.basicConfig(
     level=logging.INFO,
@@ -26,6 +30,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# YOLO weights used by each tracker
+MODELS = {
+    'botsort': 'yolo11n.pt',
+    'bytetrack': 'yolo11s.pt'
+}
+
 
 def load_config(config_path: Path) -> dict:
     """Load configuration from YAML file"""
@@ -78,62 +88,84 @@ def process_sequence(sequence_name: str,
     
     buffer_config = config['buffer']
     
-    # Step 1: Tracking with selected tracker
-    logger.info(f"Step 1: Running tracking with {tracker_type.upper()}...")
+    # Tracking, ID stitching, counting and visualization in a single pass
+    logger.info(f"Running tracking with {tracker_type.upper()}, stitching, "
+                f"line crossing detection and visualization...")
     
     # Define tracks.txt path
     tracks_file = output_seq / 'tracks.txt'
     
+    runtime_config = config.get('runtime', {})
+    tracker_kwargs = {
+        'conf_threshold': 0.3,
+        'use_tensorrt': runtime_config.get('tensorrt', True),
+        'batch_size': runtime_config.get('batch_size', 8),
+        'imgsz': runtime_config.get('imgsz', 640)
+    }
     if tracker_type == 'botsort':
-        tracker = PersonTrackerBoTSORT(model_name='yolo11n.pt', conf_threshold=0.3)
+        tracker = PersonTrackerBoTSORT(model_name=MODELS['botsort'], **tracker_kwargs)
     else:  # bytetrack
-        tracker = PersonTrackerByteTrack(model_name='yolo11s.pt', conf_threshold=0.3)
+        tracker = PersonTrackerByteTrack(model_name=MODELS['bytetrack'], **tracker_kwargs)
     
-    tracking_results = tracker.track_sequence(
-        sequence_path,
-        output_tracks=tracks_file  # Save tracks.txt
+    counter = LineCrossingCounter(
+        line_start=line_start,
+        line_end=line_end,
+        min_frames_between_crossings=buffer_config['min_frames_between_crossings'],
+        position_history_length=buffer_config['position_history_length'],
+        events_path=output_seq / 'events.jsonl'  # Events are streamed here as they happen
     )
     
-    # Limit frames if specified
-    if max_frames:
-        tracking_results = tracking_results[:max_frames]
-        logger.info(f"Limited to {max_frames} frames")
+    # Frames are yielded by the tracker as soon as they are tracked
+    read_scale = runtime_config.get('read_scale', 1)
+    stride = max(1, runtime_config.get('stride', 1))
+    frames = tracker.track_sequence_iter(sequence_path, max_frames=max_frames,
+                                         stride=stride, read_scale=read_scale)
     
-    # Step 1.5: ID Stitching (Post-processing) - only for botsort
-    stitching_stats = None
+    # ID Stitching (online) - only for botsort
+    stitcher = None
     if use_stitching and tracker_type == 'botsort':
-        logger.info("Step 1.5: Applying ID stitching post-processing...")
+        # Merges are final only once the tracker can no longer bring the
+        # earlier track back (it can still do so one frame after its buffer);
+        # the buffer counts tracked frames, stride real frames apart
         stitcher = TrackIDStitcher(
-            max_frame_gap=30,
+            max_frame_gap=(tracker.max_time_lost + 1) * stride,
             position_threshold=150.0,
             size_similarity_threshold=0.5
         )
-        
-        tracking_results_stitched = stitcher.stitch_tracks(tracking_results)
-        stitching_stats = stitcher.get_statistics(tracking_results, tracking_results_stitched)
-        
-        logger.info(f"Stitching stats: {stitching_stats}")
-        
-        # Use stitched results for counting
-        tracking_results = tracking_results_stitched
-        
-        # Re-save tracks.txt with stitched IDs
-        tracker._save_tracks_mot_format(tracking_results, tracks_file)
+        frames = stitcher.stream(frames)
     
-    # Step 2: Counting
-    logger.info("Step 2: Running line crossing detection...")
-    counter = LineCrossingCounter(
-        line_start=line_start,
-        line_end=line_end,
-        min_frames_between_crossings=buffer_config['min_frames_between_crossings'],
-        position_history_length=buffer_config['position_history_length']
-    )
+    # Visualization runs in a background thread; frames are handed over
+    # through a bounded queue so encoding overlaps tracking
+    visualizer = TrackingVisualizer(line_start, line_end)
+    video_path = output_seq / f'{sequence_name}_demo.mp4'
+    frame_queue = queue.Queue(maxsize=64)
+    
+    num_frames = 0
+    tracks_file.parent.mkdir(parents=True, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=1) as encoder:
+        encoding = encoder.submit(visualizer.consume, frame_queue, video_path,
+                                  fps=25, draw_trails=False, read_scale=read_scale)
+        try:
+            with open(tracks_file, 'w') as tracks_out:
+                for frame_data in frames:
+                    frame_events = counter.process_frame(frame_data['frame'], frame_data['tracks'])
+                    tracks_out.write(tracker._format_mot_lines(frame_data))
+                    frame_queue.put((frame_data['image_path'], frame_data, frame_events))
+                    num_frames += 1
+        finally:
+            # Sentinel: no more frames
+            frame_queue.put(None)
+            # Flush events.jsonl even if tracking failed
+            counter.close()
+        
+        logger.info(f"Saved tracks to {tracks_file}")
+        logger.info("Waiting for video encoding to finish...")
+        encoding.result()
     
-    # Process all frames
-    for frame_data in tracking_results:
-        frame_num = frame_data['frame']
-        tracks = frame_data['tracks']
-        counter.process_frame(frame_num, tracks)
+    stitching_stats = None
+    if stitcher is not None:
+        stitching_stats = stitcher.get_online_statistics()
+        logger.info(f"Stitching stats: {stitching_stats}")
     
     # Get results
     summary = counter.get_summary()
@@ -141,12 +173,11 @@ def process_sequence(sequence_name: str,
     
     logger.info(f"Counting complete: {summary}")
     
-    # Save events
+    # Save summary (events themselves are in events.jsonl)
     events_path = output_seq / 'events.json'
     with open(events_path, 'w') as f:
         json.dump({
             'summary': summary,
-            'events': events,
             'config': seq_config,
             'tracker': tracker_type,
             'stitching_enabled': use_stitching,
@@ -156,23 +187,10 @@ def process_sequence(sequence_name: str,
     
     # Create events CSV
     if events:
-        events_df = pd.DataFrame(events)
-        events_df.to_csv(output_seq / 'events.csv', index=False)
-    
-    # Step 3: Visualization
-    logger.info("Step 3: Creating visualization video...")
-    visualizer = TrackingVisualizer(line_start, line_end)
-    
-    video_path = output_seq / f'{sequence_name}_demo.mp4'
-    visualizer.create_video(
-        image_folder=sequence_path,
-        tracking_results=tracking_results,
-        events=events,
-        output_path=video_path,
-        fps=25,
-        max_frames=max_frames,
-        draw_trails=False
-    )
+        with open(output_seq / 'events.csv', 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(events[0].keys()))
+            writer.writeheader()
+            writer.writerows(events)
     
     # Create summary image
     summary_img_path = output_seq / 'summary.png'
@@ -186,7 +204,7 @@ def process_sequence(sequence_name: str,
         'tracker': tracker_type,
         'stitching_enabled': use_stitching,
         'summary': summary,
-        'num_frames': len(tracking_results),
+        'num_frames': num_frames,
         'output_path': str(output_seq),
         'stitching_stats': stitching_stats,
         'tracks_file': str(tracks_file)
@@ -218,36 +236,68 @@ def main():
     # Load config
     config = load_config(config_path)
     
-    # Store all results
-    all_results = []
-    
-    # Process each combination
+    # One job per (combination, sequence); each worker builds its own tracker
+    jobs = []
     for combo in combinations:
-        logger.info("\n" + "=" * 80)
-        logger.info(f"RUNNING COMBINATION: {combo['name']}")
-        logger.info("=" * 80 + "\n")
-        
-        combo_results = []
-        
-        # Process each sequence with this combination
         for seq_name in sequences:
+            jobs.append({
+                'combo': combo,
+                'kwargs': {
+                    'sequence_name': seq_name,
+                    'data_root': data_root,
+                    'config': config,
+                    'output_root': output_root,
+                    'combination_name': combo['output_name'],
+                    'tracker_type': combo['tracker'],
+                    'use_stitching': combo['stitching'],
+                    'max_frames': None
+                }
+            })
+    
+    # YOLO already runs multi-threaded, so keep workers to half the cores
+    max_workers = config.get('runtime', {}).get('max_workers')
+    if not max_workers:
+        max_workers = max(1, min(len(jobs), (os.cpu_count() or 2) // 2))
+    
+    # Export TensorRT engines up front so workers do not race to write the
+    # same file; done in a child process to keep CUDA out of this one
+    if config.get('runtime', {}).get('tensorrt', True):
+        models = sorted({MODELS[combo['tracker']] for combo in combinations})
+        imgsz = config.get('runtime', {}).get('imgsz', 640)
+        batch_size = max(1, config.get('runtime', {}).get('batch_size', 8))
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            list(executor.map(export_engine, models, [imgsz] * len(models),
+                              [batch_size] * len(models)))
+    
+    logger.info(f"Running {len(jobs)} jobs with {max_workers} worker processes")
+    
+    # Run all jobs in parallel
+    job_results = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(process_sequence, **job['kwargs']): i
+            for i, job in enumerate(jobs)
+        }
+        
+        for future in as_completed(futures):
+            job = jobs[futures[future]]
+            seq_name = job['kwargs']['sequence_name']
             try:
-                result = process_sequence(
-                    sequence_name=seq_name,
-                    data_root=data_root,
-                    config=config,
-                    output_root=output_root,
-                    combination_name=combo['output_name'],
-                    tracker_type=combo['tracker'],
-                    use_stitching=combo['stitching'],
-                    max_frames=None
-                )
-                combo_results.append(result)
-                all_results.append(result)
+                job_results[futures[future]] = future.result()
+                logger.info(f"Finished {seq_name} with {job['combo']['name']}")
             except Exception as e:
-                logger.error(f"Error processing {seq_name} with {combo['name']}: {e}", exc_info=True)
+                logger.error(f"Error processing {seq_name} with {job['combo']['name']}: {e}", exc_info=True)
+    
+    # Store all results, in job order
+    all_results = [job_results[i] for i in range(len(jobs)) if i in job_results]
+    
+    # Save each combination summary
+    for combo in combinations:
+        combo_results = [
+            job_results[i] for i, job in enumerate(jobs)
+            if job['combo'] is combo and i in job_results
+        ]
         
-        # Save combination summary
         combo_summary_path = output_root / combo['output_name'] / 'combination_summary.json'
         combo_summary_path.parent.mkdir(parents=True, exist_ok=True)
         with open(combo_summary_path, 'w') as f:
@@ -306,6 +356,7 @@ def main():
     print("    │   ├── MOT17-04/")
     print("    │   │   ├── tracks.txt")
     print("    │   │   ├── events.json")
+    print("    │   │   ├── events.jsonl")
     print("    │   │   └── MOT17-04.mp4")
     print("    │   ├── MOT17-09/")
     print("    │   └── MOT17-13/")
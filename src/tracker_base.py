@@ -0,0 +1,333 @@
+"""
+Shared YOLO detection and tracking pipeline of the person trackers
+"""
+import cv2
+import numpy as np
+from pathlib import Path
+from typing import List, Tuple, Dict, Iterator, Optional
+import logging
+
+from model_loader import load_model, load_tracker
+from frame_io import read_frames, read_video_frames
+from frame_result import FrameResult
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class PersonTracker:
+    """
+    Person detection with YOLO and tracking with an Ultralytics tracker
+    
+    Subclasses pick the tracker by setting the class attributes below.
+    """
+    
+    # Tracker name for logging
+    TRACKER_NAME = None
+    # Ultralytics tracker YAML
+    TRACKER_CONFIG = None
+    # Extra arguments of YOLO predict (e.g. the NMS IoU threshold)
+    PREDICT_ARGS = {}
+    
+    def __init__(self, model_name: str, conf_threshold: float = 0.3,
+                 use_tensorrt: bool = True, batch_size: int = 8, imgsz: int = 640):
+        """
+        Initialize tracker
+        
+        Args:
+            model_name: YOLO model to use
+            conf_threshold: Confidence threshold for detections
+            use_tensorrt: Run a TensorRT FP16 engine when a CUDA device is available
+            batch_size: Number of frames passed to the model per call
+            imgsz: Model input size; larger frames are downscaled before inference
+        """
+        self.batch_size = max(1, batch_size)
+        self.model = load_model(model_name, use_tensorrt=use_tensorrt, imgsz=imgsz,
+                                batch_size=self.batch_size)
+        self.conf_threshold = conf_threshold
+        self.imgsz = imgsz
+        
+        # Tracker state lives across batches; detections are fed to it frame by frame
+        self.tracker = load_tracker(self.TRACKER_CONFIG)
+        
+        # Resized model input of each batch slot, reused across batches
+        self._input_buffers = [None] * self.batch_size
+        
+        # Frame shape (height, width) per image folder
+        self._frame_shapes = {}
+        logger.info(f"Loaded model: {model_name} with {self.TRACKER_NAME} tracker")
+    
+    @property
+    def max_time_lost(self) -> int:
+        """Tracked frames a lost track is kept for, and can come back in, before it is removed"""
+        return self.tracker.max_time_lost
+    
+    def track_sequence(self, image_folder: Path, output_tracks: Path = None,
+                       stride: int = 1, read_scale: int = 1) -> List[Dict]:
+        """
+        Track persons through a sequence of images
+        
+        Args:
+            image_folder: Path to folder containing sequence images
+            output_tracks: Path to save tracking results in MOT format
+            stride: Track every stride-th frame, see track_sequence_iter
+            read_scale: Decode images at 1/read_scale resolution, see track_sequence_iter
+            
+        Returns:
+            List of tracking results per frame
+        """
+        all_results = list(self.track_sequence_iter(image_folder, stride=stride,
+                                                    read_scale=read_scale))
+        
+        # ALWAYS save tracks in MOT format
+        if output_tracks:
+            self._save_tracks_mot_format(all_results, output_tracks)
+        
+        logger.info(f"Tracking complete: {len(all_results)} frames processed")
+        return all_results
+    
+    def track_sequence_iter(self, image_folder: Path, max_frames: int = None,
+                            stride: int = 1, read_scale: int = 1) -> Iterator[Dict]:
+        """
+        Track persons through a sequence of images, one frame at a time
+        
+        With stride > 1 only every stride-th image is decoded and tracked;
+        the frames in between reuse the detections of the last tracked frame.
+        
+        With read_scale > 1 JPEGs are decoded at reduced resolution, which
+        is cheaper when frames are downscaled to imgsz anyway; boxes are
+        still reported in full-resolution coordinates.
+        
+        Args:
+            image_folder: Path to folder containing sequence images
+            max_frames: Maximum frames to process (None for all)
+            stride: Track every stride-th frame
+            read_scale: Decode images at 1/read_scale resolution (1, 2, 4 or 8)
+            
+        Yields:
+            Tracking results of each frame as soon as it is processed
+        """
+        # Get sorted list of images
+        image_files = sorted(list(image_folder.glob('*.jpg')))
+        if not image_files:
+            raise ValueError(f"No images found in {image_folder}")
+        
+        if max_frames:
+            image_files = image_files[:max_frames]
+        
+        logger.info(f"Found {len(image_files)} images in sequence")
+        
+        stride = max(1, stride)
+        tracked_files = image_files[::stride]
+        image_paths = [str(img_path) for img_path in image_files]
+        
+        def numbered_frames():
+            for i, (img_path, frame) in enumerate(read_frames(tracked_files, read_scale=read_scale)):
+                if frame is None:
+                    logger.warning(f"Could not read {img_path}")
+                    continue
+                if read_scale == 1:
+                    self._frame_shapes.setdefault(image_folder, frame.shape[:2])
+                yield i * stride, str(img_path), frame
+        
+        # Images are decoded in a background thread while the model runs
+        yield from self._track_frames(numbered_frames(), len(image_files),
+                                      image_paths=image_paths, stride=stride,
+                                      read_scale=read_scale)
+    
+    def track_video(self, video_path: Path, max_frames: int = None,
+                    stride: int = 1) -> Iterator[Dict]:
+        """
+        Track persons through a video file, one frame at a time
+        
+        Frames are grabbed with cv2.VideoCapture; with stride > 1 only
+        every stride-th frame is decoded and tracked.
+        
+        Args:
+            video_path: Path to the video file
+            max_frames: Maximum frames to read (None for all)
+            stride: Track every stride-th frame
+            
+        Yields:
+            Tracking results of each tracked frame ('image_path' is None)
+        """
+        cap = cv2.VideoCapture(str(video_path))
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        if max_frames:
+            total = min(total, max_frames) if total > 0 else max_frames
+        
+        logger.info(f"Tracking video {video_path} ({total} frames, stride {stride})")
+        
+        frames = ((frame_idx, None, frame) for frame_idx, frame
+                  in read_video_frames(video_path, max_frames=max_frames, stride=stride))
+        yield from self._track_frames(frames, total)
+    
+    def _track_frames(self, frames: Iterator[Tuple[int, Optional[str], np.ndarray]],
+                      total: int, image_paths: List[str] = None,
+                      stride: int = 1, read_scale: int = 1) -> Iterator[Dict]:
+        """
+        Track (frame index, image path, image) triples in micro-batches
+        
+        Args:
+            frames: Frames to track, in order
+            total: Number of frames in the sequence
+            image_paths: Image path of every frame, for the skipped ones
+            stride: Frames from each tracked frame to the next one
+            read_scale: Factor the frames were downscaled by when decoded
+        
+        Yields:
+            Tracking results of each frame, in frame order
+        """
+        batch = []
+        for item in frames:
+            batch.append(item)
+            if len(batch) == self.batch_size:
+                yield from self._track_batch(batch, total, image_paths, stride, read_scale)
+                batch = []
+        
+        if batch:
+            yield from self._track_batch(batch, total, image_paths, stride, read_scale)
+    
+    def _track_batch(self, batch: List[Tuple[int, Optional[str], np.ndarray]],
+                     total: int, image_paths: List[str] = None,
+                     stride: int = 1, read_scale: int = 1) -> Iterator[Dict]:
+        """
+        Run tracking on a micro-batch of (frame index, image path, image) triples
+        
+        YOLO detects on the whole batch in one call; the tracker is then
+        updated with each frame's detections in order.
+        
+        Frames skipped after a tracked frame (stride > 1) are yielded with
+        copies of its tracks.
+        
+        Yields:
+            Tracking results of each frame, in frame order
+        """
+        # Detect on the whole batch
+        inputs = [self._resize_input(slot, frame) for slot, (_, _, frame) in enumerate(batch)]
+        results = self.model.predict(
+            [image for image, _ in inputs],
+            conf=self.conf_threshold,
+            classes=[0],  # 0 is person class in COCO
+            imgsz=self.imgsz,
+            verbose=False,
+            **self.PREDICT_ARGS
+        )
+        
+        # Results come back in frame order; the tracker is updated in that order
+        for (frame_idx, image_path, _), (image, scale), result in zip(batch, inputs, results):
+            # One transfer for all detection columns
+            tracks = self.tracker.update(result.boxes.cpu().numpy(), image)
+            
+            # Map boxes back to the full-resolution frame
+            frame_result = self._extract_tracks(tracks, frame_idx + 1, scale / read_scale)
+            yield {
+                'frame': frame_idx + 1,
+                'image_path': image_path,
+                'tracks': frame_result.to_dicts()
+            }
+            
+            # Skipped frames reuse the detections of this one
+            for skipped_idx in range(frame_idx + 1, min(frame_idx + stride, total)):
+                frame_result.frame = skipped_idx + 1
+                yield {
+                    'frame': skipped_idx + 1,
+                    'image_path': image_paths[skipped_idx],
+                    'tracks': frame_result.to_dicts()
+                }
+            
+            if (frame_idx + 1) % 50 < stride:
+                logger.info(f"Processed {frame_idx + 1}/{total} frames")
+    
+    def _resize_input(self, slot: int, frame: np.ndarray) -> Tuple[np.ndarray, float]:
+        """
+        Downscale a frame to fit imgsz, into the reused buffer of its batch slot
+        
+        The size matches YOLO's letterbox, so YOLO only pads the frame
+        instead of resizing it again. Smaller frames are passed unchanged.
+        
+        Returns:
+            (model input, scale from frame to model input coordinates)
+        """
+        height, width = frame.shape[:2]
+        scale = min(self.imgsz / height, self.imgsz / width)
+        if scale >= 1:
+            return frame, 1.0
+        
+        size = (int(round(width * scale)), int(round(height * scale)))
+        buffer = self._input_buffers[slot]
+        if buffer is None or buffer.shape[:2] != size[::-1] or buffer.shape[2:] != frame.shape[2:]:
+            buffer = np.empty(size[::-1] + frame.shape[2:], dtype=frame.dtype)
+            self._input_buffers[slot] = buffer
+        cv2.resize(frame, size, dst=buffer, interpolation=cv2.INTER_LINEAR)
+        return buffer, scale
+    
+    def _extract_tracks(self, tracks: np.ndarray, frame_num: int,
+                        scale: float = 1.0) -> FrameResult:
+        """
+        Extract tracks of one frame from the tracker output as arrays
+        
+        Tracker rows are x1, y1, x2, y2, track_id, score, cls, detection index.
+        Boxes are divided by scale to map them back to the original frame.
+        """
+        if len(tracks) == 0:
+            return FrameResult.empty(frame_num)
+        
+        return FrameResult.from_arrays(
+            frame_num,
+            boxes=tracks[:, :4] / scale,
+            ids=tracks[:, 4],
+            confs=tracks[:, 5]
+        )
+    
+    def _save_tracks_mot_format(self, results: List[Dict], output_path: Path):
+        """
+        Save tracking results in MOT challenge format
+        Format: <frame>, <id>, <bb_left>, <bb_top>, <bb_width>, <bb_height>, <conf>, -1, -1, -1
+        """
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        with open(output_path, 'w') as f:
+            f.write(self._format_mot_rows(results))
+        
+        logger.info(f"Saved tracks to {output_path}")
+    
+    def _format_mot_lines(self, frame_data: Dict) -> str:
+        """
+        Format one frame's tracks as MOT challenge lines
+        Format: <frame>, <id>, <bb_left>, <bb_top>, <bb_width>, <bb_height>, <conf>, -1, -1, -1
+        """
+        return self._format_mot_rows([frame_data])
+    
+    def _format_mot_rows(self, results: List[Dict]) -> str:
+        """
+        Format the tracks of several frames as MOT challenge lines
+        
+        All tracks are flattened into one array, widths and heights are
+        computed column-wise and the whole block is formatted in one call.
+        """
+        rows = [
+            (frame_data['frame'], track['track_id'], *track['bbox'], track['confidence'])
+            for frame_data in results
+            for track in frame_data['tracks']
+        ]
+        if not rows:
+            return ''
+        
+        # Columns: frame, id, x1, y1, x2 -> width, y2 -> height, conf
+        table = np.array(rows, dtype=np.float64)
+        table[:, 4:6] -= table[:, 2:4]
+        
+        # MOT format
+        line_format = '%d,%d,%.2f,%.2f,%.2f,%.2f,%.2f,-1,-1,-1\n'
+        return (line_format * len(table)) % tuple(table.ravel().tolist())
+    
+    def get_frame_shape(self, image_folder: Path) -> Tuple[int, int]:
+        """Get the shape (height, width) of frames in the sequence"""
+        # Known once a frame of the sequence has been tracked
+        if image_folder not in self._frame_shapes:
+            first_image = next(image_folder.glob('*.jpg'))
+            frame = cv2.imread(str(first_image))
+            self._frame_shapes[image_folder] = frame.shape[:2]
+        return self._frame_shapes[image_folder]  # (height, width)
\ No newline at end of file
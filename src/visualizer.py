@@ -2,14 +2,100 @@
 Visualization module for creating overlay videos with tracking and counting info
 """
 import cv2
+import queue
 import numpy as np
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Tuple
 import logging
 
+from frame_io import read_frames, imread_flag, FrameWriter
+from _visualizer_kernels import update_trails, trail_points, warm_up, HAVE_NUMBA
+
 logger = logging.getLogger(__name__)
 
 
+class TrackTrails:
+    """
+    Recent center positions of every track, kept in a ring buffer per track
+    """
+
+    # Number of track slots allocated up front (grows on demand)
+    INITIAL_CAPACITY = 256
+
+    def __init__(self, length: int = 30):
+        """
+        Args:
+            length: Number of positions kept per track
+        """
+        # track_id -> slot in the ring buffer arrays
+        self.track_slots = {}
+        self.trails = np.zeros((self.INITIAL_CAPACITY, length, 2), dtype=np.float32)
+        self.lens = np.zeros(self.INITIAL_CAPACITY, dtype=np.int32)
+        self.heads = np.zeros(self.INITIAL_CAPACITY, dtype=np.int32)
+
+    def update(self, tracks: List[Dict]) -> None:
+        """Append the centers of one frame's tracks"""
+        if not tracks:
+            return
+
+        slots = np.fromiter((self._slot(track['track_id']) for track in tracks),
+                            dtype=np.intp, count=len(tracks))
+        centers = np.array([track['center'] for track in tracks], dtype=np.float32)
+        update_trails(self.trails, self.lens, self.heads, slots, centers)
+
+    def points(self) -> List[np.ndarray]:
+        """Integer points of trails with at least two positions, oldest first"""
+        num_slots = len(self.track_slots)
+        if num_slots == 0:
+            return []
+
+        points = trail_points(self.trails, self.lens, self.heads, num_slots)
+        return [points[slot, :n] for slot, n in enumerate(self.lens[:num_slots].tolist()) if n > 1]
+
+    def _slot(self, track_id: int) -> int:
+        """Get the slot of a track, allocating one if needed"""
+        slot = self.track_slots.get(track_id)
+        if slot is None:
+            slot = len(self.track_slots)
+            if slot == len(self.lens):
+                self._grow()
+            self.track_slots[track_id] = slot
+        return slot
+
+    def _grow(self) -> None:
+        """Double the number of slots"""
+        capacity = len(self.lens)
+        self.trails = np.concatenate([self.trails, np.zeros_like(self.trails)])
+        self.lens = np.concatenate([self.lens, np.zeros(capacity, dtype=np.int32)])
+        self.heads = np.concatenate([self.heads, np.zeros(capacity, dtype=np.int32)])
+
+
+class DequeTrackTrails:
+    """
+    TrackTrails for when Numba is not installed: a deque(maxlen=length)
+    per track, which beats running the ring buffer kernels as plain Python
+    """
+
+    def __init__(self, length: int = 30):
+        """
+        Args:
+            length: Number of positions kept per track
+        """
+        # track_id -> recent centers; the oldest one is dropped on append
+        self.trails = defaultdict(lambda: deque(maxlen=length))
+
+    def update(self, tracks: List[Dict]) -> None:
+        """Append the centers of one frame's tracks"""
+        for track in tracks:
+            self.trails[track['track_id']].append(track['center'])
+
+    def points(self) -> List[np.ndarray]:
+        """Integer points of trails with at least two positions, oldest first"""
+        return [np.array(trail, dtype=np.int32) for trail in self.trails.values() if len(trail) > 1]
+
+
 class TrackingVisualizer:
     """
     Create visualization overlays for tracking and counting
@@ -31,6 +117,12 @@ class TrackingVisualizer:
         self.crossing_in_color = (0, 255, 0)  # Green
         self.crossing_out_color = (0, 0, 255)  # Red
 
+        # Counting line pixels per (frame shape (height, width), read scale)
+        self._line_pixel_cache = {}
+
+        # Compile the trail kernels up front instead of on the first frame
+        warm_up()
+
     def create_video(self,
                      image_folder: Path,
                      tracking_results: List[Dict],
@@ -38,10 +130,14 @@ class TrackingVisualizer:
                      output_path: Path,
                      fps: int = 25,
                      max_frames: int = None,
-                     draw_trails: bool = True) -> None:
+                     draw_trails: bool = True,
+                     read_scale: int = 1) -> None:
         """
         Create visualization video with tracking overlay
 
+        With read_scale > 1 the images are decoded at reduced resolution
+        and the video is written at that size, e.g. for a quick preview.
+
         Args:
             image_folder: Path to sequence images
             tracking_results: Tracking results from tracker
@@ -50,6 +146,7 @@ class TrackingVisualizer:
             fps: Frames per second
             max_frames: Maximum frames to process (None for all)
             draw_trails: Whether to draw track trails
+            read_scale: Decode images at 1/read_scale resolution (1, 2, 4 or 8)
         """
         # Get sorted images
         image_files = sorted(list(image_folder.glob('*.jpg')))
@@ -57,103 +154,44 @@ class TrackingVisualizer:
         if max_frames:
             image_files = image_files[:max_frames]
 
-        # Get frame size
-        first_frame = cv2.imread(str(image_files[0]))
-        height, width = first_frame.shape[:2]
-
-        # Create video writer
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(str(output_path), fourcc, fps, (width, height))
-
-        # Build event lookup by frame
+        # Build event lookup by frame, as position and direction arrays
         events_by_frame = {}
         for event in events:
-            frame_num = event['frame']
-            if frame_num not in events_by_frame:
-                events_by_frame[frame_num] = []
-            events_by_frame[frame_num].append(event)
-
-        # Track trails
-        track_trails = {}  # track_id -> list of centers
+            events_by_frame.setdefault(event['frame'], []).append(event)
+        event_positions_by_frame = {}
+        event_dirs_by_frame = {}
+        for frame_num, frame_events in events_by_frame.items():
+            event_positions_by_frame[frame_num], event_dirs_by_frame[frame_num] = \
+                self._event_arrays(frame_events)
+        no_positions, no_dirs = self._event_arrays([])
 
-        # Current counts
-        count_in = 0
-        count_out = 0
+        # Track trails and current counts
+        state = self._new_render_state(read_scale)
 
         logger.info(f"Creating video with {len(image_files)} frames...")
 
-        for idx, img_path in enumerate(image_files):
-            frame = cv2.imread(str(img_path))
+        # Video writer, opened once the first frame gives the size;
+        # frames are encoded in a background thread
+        out = None
+
+        # Images are decoded in a background thread, ahead of drawing
+        for idx, (img_path, frame) in enumerate(read_frames(image_files, read_scale=read_scale)):
             frame_num = idx + 1
 
+            if out is None:
+                height, width = frame.shape[:2]
+                out = FrameWriter(output_path, fps, (width, height))
+
             # Get tracking data for this frame
             if idx < len(tracking_results):
                 tracks = tracking_results[idx]['tracks']
             else:
                 tracks = []
 
-            # Draw counting line
-            cv2.line(frame, self.line_start, self.line_end,
-                    self.line_color, 3)
-
-            # Update trails and draw tracks
-            for track in tracks:
-                track_id = track['track_id']
-                bbox = track['bbox']
-                center = track['center']
-
-                # Update trail
-                if track_id not in track_trails:
-                    track_trails[track_id] = []
-                track_trails[track_id].append(center)
-
-                # Keep only recent positions
-                if len(track_trails[track_id]) > 30:
-                    track_trails[track_id].pop(0)
-
-                # Draw bounding box
-                x1, y1, x2, y2 = map(int, bbox)
-                cv2.rectangle(frame, (x1, y1), (x2, y2), self.bbox_color, 2)
-
-                # Draw track ID
-                label = f"ID:{track_id}"
-                cv2.putText(frame, label, (x1, y1 - 10),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, self.text_color, 2)
-
-                # Draw center point
-                cx, cy = map(int, center)
-                cv2.circle(frame, (cx, cy), 4, self.bbox_color, -1)
-
-            # Draw trails
-            if draw_trails:
-                for track_id, trail in track_trails.items():
-                    if len(trail) > 1:
-                        points = np.array(trail, dtype=np.int32)
-                        cv2.polylines(frame, [points], False, (255, 0, 255), 2)
-
-            # Check for crossing events in this frame
-            if frame_num in events_by_frame:
-                for event in events_by_frame[frame_num]:
-                    if event['direction'] == 'IN':
-                        count_in += 1
-                        color = self.crossing_in_color
-                    else:
-                        count_out += 1
-                        color = self.crossing_out_color
-
-                    # Flash effect: draw circle at crossing position
-                    pos = event['position']
-                    cv2.circle(frame, (int(pos[0]), int(pos[1])), 20, color, 3)
-
-                    # Show direction arrow near crossing
-                    arrow_text = "IN" if event['direction'] == 'IN' else "OUT"
-                    cv2.putText(frame, arrow_text,
-                               (int(pos[0]) + 25, int(pos[1])),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
-
-            # Draw counter info
-            self._draw_counter_panel(frame, frame_num, count_in, count_out, len(tracks))
+            self._render_frame(frame, frame_num, tracks,
+                               event_positions_by_frame.get(frame_num, no_positions),
+                               event_dirs_by_frame.get(frame_num, no_dirs),
+                               state, draw_trails)
 
             # Write frame
             out.write(frame)
@@ -161,9 +199,259 @@ class TrackingVisualizer:
             if (frame_num) % 100 == 0:
                 logger.info(f"Processed {frame_num}/{len(image_files)} frames")
 
-        out.release()
+        if out is not None:
+            out.release()
         logger.info(f"Video saved to {output_path}")
 
+    def consume(self,
+                frame_queue: queue.Queue,
+                output_path: Path,
+                fps: int = 25,
+                draw_trails: bool = True,
+                read_scale: int = 1,
+                workers: int = 2) -> int:
+        """
+        Render and encode frames as they are put on a queue
+
+        Meant to run in a background thread while tracking is still going.
+        The video writer is opened on the first frame.
+
+        Trails and counts are advanced here, in frame order; decoding and
+        drawing each frame then runs on a small thread pool (OpenCV releases
+        the GIL), and the rendered frames are written in order.
+
+        Args:
+            frame_queue: Queue of (image_path, frame_data, frame_events) tuples,
+                terminated by None
+            output_path: Output video path
+            fps: Frames per second
+            draw_trails: Whether to draw track trails
+            read_scale: Decode images at 1/read_scale resolution (1, 2, 4 or 8)
+            workers: Number of render threads
+
+        Returns:
+            Number of frames written
+        """
+        out = None
+        state = self._new_render_state(read_scale)
+        read_flag = imread_flag(read_scale)
+        num_frames = 0
+
+        # Most frames have no crossing events; they share one pair of empty arrays
+        no_events = self._event_arrays([])
+
+        def render(image_path: str, frame_num: int, tracks: List[Dict],
+                   event_positions: np.ndarray, event_dirs: np.ndarray,
+                   overlay: Dict) -> np.ndarray:
+            """Read and draw one frame"""
+            frame = cv2.imread(str(image_path), read_flag)
+            self._draw_frame(frame, frame_num, tracks, event_positions, event_dirs, overlay)
+            return frame
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # Frames being rendered, oldest first; bounded to limit memory
+                pending = deque()
+                while True:
+                    item = frame_queue.get()
+                    if item is None:
+                        break
+
+                    image_path, frame_data, frame_events = item
+                    tracks = frame_data['tracks']
+                    event_positions, event_dirs = (self._event_arrays(frame_events)
+                                                   if frame_events else no_events)
+                    overlay = self._advance_state(state, tracks, event_dirs, draw_trails)
+                    pending.append(executor.submit(render, image_path, frame_data['frame'], tracks,
+                                                   event_positions, event_dirs, overlay))
+                    if len(pending) < 2 * workers:
+                        continue
+
+                    out = self._write_rendered(pending.popleft().result(), out, output_path, fps)
+                    num_frames += 1
+                    if num_frames % 100 == 0:
+                        logger.info(f"Encoded {num_frames} frames")
+
+                while pending:
+                    out = self._write_rendered(pending.popleft().result(), out, output_path, fps)
+                    num_frames += 1
+        except Exception:
+            # Keep taking frames so the producer never blocks on a full queue
+            while frame_queue.get() is not None:
+                pass
+            raise
+        finally:
+            if out is not None:
+                out.release()
+
+        logger.info(f"Video saved to {output_path}")
+        return num_frames
+
+    @staticmethod
+    def _write_rendered(frame: np.ndarray, out: FrameWriter, output_path: Path,
+                        fps: int) -> FrameWriter:
+        """Write a frame, opening the video writer on the first one"""
+        if out is None:
+            height, width = frame.shape[:2]
+            out = FrameWriter(output_path, fps, (width, height))
+        out.write(frame)
+        return out
+
+    def _new_render_state(self, read_scale: int = 1) -> Dict:
+        """
+        State carried between frames: track trails and current counts
+
+        read_scale is the factor frames are downscaled by; track and event
+        coordinates are divided by it when drawing.
+        """
+        return {
+            'trails': TrackTrails(length=30) if HAVE_NUMBA else DequeTrackTrails(length=30),
+            'count_in': 0,
+            'count_out': 0,
+            'read_scale': read_scale
+        }
+
+    def _render_frame(self,
+                      frame: np.ndarray,
+                      frame_num: int,
+                      tracks: List[Dict],
+                      event_positions: np.ndarray,
+                      event_dirs: np.ndarray,
+                      state: Dict,
+                      draw_trails: bool) -> None:
+        """
+        Update the state with a frame and draw its overlay on it
+
+        Crossing events are given as arrays, see _event_arrays.
+        """
+        overlay = self._advance_state(state, tracks, event_dirs, draw_trails)
+        self._draw_frame(frame, frame_num, tracks, event_positions, event_dirs, overlay)
+
+    @staticmethod
+    def _advance_state(state: Dict, tracks: List[Dict], event_dirs: np.ndarray,
+                       draw_trails: bool) -> Dict:
+        """
+        Add one frame's track centers to the trails and its crossing events to the counts
+
+        Returns:
+            What the frame's overlay needs from the state: its trail points,
+            counts and read scale, as a snapshot that later frames do not change
+        """
+        if draw_trails:
+            state['trails'].update(tracks)
+
+        num_in = int(event_dirs.sum())
+        state['count_in'] += num_in
+        state['count_out'] += len(event_dirs) - num_in
+
+        return {
+            'trails': state['trails'].points() if draw_trails else [],
+            'count_in': state['count_in'],
+            'count_out': state['count_out'],
+            'read_scale': state['read_scale']
+        }
+
+    def _draw_frame(self,
+                    frame: np.ndarray,
+                    frame_num: int,
+                    tracks: List[Dict],
+                    event_positions: np.ndarray,
+                    event_dirs: np.ndarray,
+                    overlay: Dict) -> None:
+        """Draw the line, tracks, trails, crossing events and counter panel on a frame"""
+        scale = overlay['read_scale']
+
+        # Draw counting line from its precomputed pixels
+        line_ys, line_xs = self._line_pixels(frame.shape[:2], scale)
+        frame[line_ys, line_xs] = self.line_color
+
+        # Draw tracks
+        track_ids, boxes, centers = self._int_track_arrays(tracks, scale)
+        for track_id, (x1, y1, x2, y2), (cx, cy) in zip(track_ids, boxes, centers):
+            # Draw bounding box
+            cv2.rectangle(frame, (x1, y1), (x2, y2), self.bbox_color, 2)
+
+            # Draw track ID
+            label = f"ID:{track_id}"
+            cv2.putText(frame, label, (x1, y1 - 10),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, self.text_color, 2)
+
+            # Draw center point
+            cv2.circle(frame, (cx, cy), 4, self.bbox_color, -1)
+
+        # Draw trails, all in one call
+        trails = overlay['trails']
+        if trails:
+            if scale > 1:
+                trails = [points // scale for points in trails]
+            cv2.polylines(frame, trails, False, (255, 0, 255), 2)
+
+        # Crossing events in this frame
+        if scale > 1:
+            event_positions = event_positions // scale
+        for (x, y), is_in in zip(event_positions.tolist(), event_dirs.tolist()):
+            color = self.crossing_in_color if is_in else self.crossing_out_color
+
+            # Flash effect: draw circle at crossing position
+            cv2.circle(frame, (x, y), 20, color, 3)
+
+            # Show direction arrow near crossing
+            arrow_text = "IN" if is_in else "OUT"
+            cv2.putText(frame, arrow_text, (x + 25, y),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+
+        # Draw counter info
+        self._draw_counter_panel(frame, frame_num, overlay['count_in'],
+                                 overlay['count_out'], len(tracks))
+
+    @staticmethod
+    def _int_track_arrays(tracks: List[Dict],
+                          scale: int = 1) -> Tuple[List[int], List[List[int]], List[List[int]]]:
+        """
+        Track IDs with integer bboxes and centers of one frame
+
+        All coordinates are truncated to int in one NumPy cast per frame,
+        then divided by scale for frames decoded at reduced resolution.
+        """
+        if not tracks:
+            return [], [], []
+
+        track_ids = [track['track_id'] for track in tracks]
+        boxes = np.array([track['bbox'] for track in tracks], dtype=np.float64).astype(np.int32)
+        centers = np.array([track['center'] for track in tracks], dtype=np.float64).astype(np.int32)
+        if scale > 1:
+            boxes //= scale
+            centers //= scale
+        return track_ids, boxes.tolist(), centers.tolist()
+
+    @staticmethod
+    def _event_arrays(frame_events: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Crossing events of one frame as (K, 2) int32 positions and (K,) bool IN flags
+
+        Positions are truncated to int like the other drawing coordinates.
+        """
+        positions = np.array([event['position'][:2] for event in frame_events],
+                             dtype=np.float64).reshape(-1, 2).astype(np.int32)
+        is_in = np.array([event['direction'] == 'IN' for event in frame_events], dtype=bool)
+        return positions, is_in
+
+    def _line_pixels(self, frame_shape: Tuple[int, int],
+                     scale: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Pixel coordinates (ys, xs) of the counting line, rasterized once per
+        frame size and read scale
+        """
+        pixels = self._line_pixel_cache.get((frame_shape, scale))
+        if pixels is None:
+            mask = np.zeros(frame_shape, dtype=np.uint8)
+            line_start = (self.line_start[0] // scale, self.line_start[1] // scale)
+            line_end = (self.line_end[0] // scale, self.line_end[1] // scale)
+            cv2.line(mask, line_start, line_end, 255, 3)
+            pixels = np.nonzero(mask)
+            self._line_pixel_cache[(frame_shape, scale)] = pixels
+        return pixels
+
     def _draw_counter_panel(self, frame: np.ndarray,
                            frame_num: int,
                            count_in: int,
@@ -172,10 +460,12 @@ class TrackingVisualizer:
         """Draw information panel on frame"""
         height, width = frame.shape[:2]
 
-        # Semi-transparent background
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (10, 10), (350, 150), (0, 0, 0), -1)
-        cv2.addWeighted(overlay, 0.6, frame, 0.4, 0, frame)
+        # Semi-transparent background, blended only inside the panel
+        # (pixels (10, 10) to (350, 150) inclusive)
+        panel = frame[10:min(151, height), 10:min(351, width)]
+        if panel.size:
+            # Blending with black is a scale by 0.4, done in place
+            cv2.convertScaleAbs(panel, dst=panel, alpha=0.4)
 
         # Text information
         y_offset = 35
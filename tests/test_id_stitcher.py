@@ -0,0 +1,99 @@
+"""
+Regression tests for offline and online track stitching
+"""
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'src'))
+
+from id_stitcher import TrackIDStitcher  # noqa: E402
+from counter import LineCrossingCounter  # noqa: E402
+
+
+def make_track(track_id, x, y):
+    """Track dictionary with a 40x100 bbox centered at (x, y)"""
+    return {'track_id': track_id, 'center': [x, y], 'bbox': [x - 20, y - 50, x + 20, y + 50]}
+
+
+def make_frames(num_frames, tracks_by_frame):
+    """Per-frame tracking results from a frame_num -> tracks mapping"""
+    return [{'frame': frame_num, 'tracks': tracks_by_frame.get(frame_num, [])}
+            for frame_num in range(1, num_frames + 1)]
+
+
+class OfflineStitchingTest(unittest.TestCase):
+
+    def test_overlapping_tracks_are_not_both_merged_into_one_fragment(self):
+        # Tracks 1 and 2 walk side by side in frames 1-10; track 3 starts in
+        # frame 12 between their end positions and matches both of them
+        tracks_by_frame = {f: [make_track(1, 100.0, 450.0), make_track(2, 160.0, 450.0)]
+                           for f in range(1, 11)}
+        tracks_by_frame.update({f: [make_track(3, 130.0, 450.0)] for f in range(12, 20)})
+
+        stitcher = TrackIDStitcher()
+        frames = stitcher.stitch_tracks(make_frames(19, tracks_by_frame))
+
+        for frame_data in frames:
+            track_ids = [track['track_id'] for track in frame_data['tracks']]
+            self.assertEqual(len(track_ids), len(set(track_ids)), frame_data['frame'])
+        self.assertEqual(len({track['track_id'] for frame_data in frames
+                              for track in frame_data['tracks']}), 2)
+
+
+class OnlineStitchingTest(unittest.TestCase):
+
+    def test_new_id_in_the_frame_the_old_one_vanishes_is_merged(self):
+        # Track 1 is seen in frames 1-10, track 2 starts right after it
+        tracks_by_frame = {f: [make_track(1, 100.0, 450.0)] for f in range(1, 11)}
+        tracks_by_frame.update({f: [make_track(2, 100.0, 460.0)] for f in range(11, 20)})
+
+        stitcher = TrackIDStitcher()
+        frames = list(stitcher.stream(make_frames(19, tracks_by_frame)))
+
+        self.assertEqual(stitcher.get_online_statistics()['ids_merged'], 1)
+        self.assertEqual({track['track_id'] for frame_data in frames for track in frame_data['tracks']}, {1})
+
+    def test_undone_merge_does_not_reach_the_counter(self):
+        # Track 1 stands above the line at y=500 and misses frame 11; track 2
+        # appears below the line in frame 12 and track 1 comes back in frame 13
+        tracks_by_frame = {f: [make_track(1, 100.0, 450.0)] for f in range(1, 11)}
+        tracks_by_frame[12] = [make_track(2, 100.0, 540.0)]
+        tracks_by_frame.update({f: [make_track(1, 100.0, 450.0), make_track(2, 100.0, 540.0)]
+                                for f in range(13, 20)})
+
+        stitcher = TrackIDStitcher()
+        counter = LineCrossingCounter((0, 500), (1920, 500))
+
+        num_frames = 0
+        for frame_data in stitcher.stream(make_frames(19, tracks_by_frame)):
+            counter.process_frame(frame_data['frame'], frame_data['tracks'])
+            num_frames += 1
+
+        self.assertEqual(num_frames, 19)
+        self.assertEqual(counter.get_events(), [])
+        self.assertEqual(stitcher.get_online_statistics()['ids_merged'], 0)
+
+    def test_master_coming_back_after_its_merge_gets_a_new_id(self):
+        # Track 1 is seen in frames 1-10 and continued by track 2 from frame 12;
+        # track 1 comes back once the merge is final, while track 2 is still there
+        for return_frame in (41, 42):
+            with self.subTest(return_frame=return_frame):
+                tracks_by_frame = {f: [make_track(1, 100.0, 450.0)] for f in range(1, 11)}
+                tracks_by_frame.update({f: [make_track(2, 100.0, 460.0)] for f in range(12, 61)})
+                for f in range(return_frame, 61):
+                    tracks_by_frame[f] = [make_track(2, 100.0, 460.0), make_track(1, 300.0, 450.0)]
+
+                stitcher = TrackIDStitcher()
+                frames = list(stitcher.stream(make_frames(60, tracks_by_frame)))
+
+                self.assertEqual(len(frames), 60)
+                for frame_data in frames:
+                    track_ids = [track['track_id'] for track in frame_data['tracks']]
+                    self.assertEqual(len(track_ids), len(set(track_ids)), frame_data['frame'])
+                self.assertEqual(frames[-1]['tracks'][0]['track_id'], 1)
+                self.assertNotIn(frames[-1]['tracks'][1]['track_id'], (1, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()